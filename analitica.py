@@ -0,0 +1,318 @@
+# analitica.py — Informe posterior a la carrera, en streaming sobre el diario
+#
+# Recorre answers.jsonl línea a línea (de una o varias salas) y acumula:
+#   - dificultad por pregunta (tasa de acierto, tiempos agotados)
+#   - frecuencia de cada opción (distractores) por pregunta
+#   - tiempo por pregunta de cada jugador, a partir de la diferencia entre
+#     timestamps consecutivos (incluye el feedback y el clic en "Continuar")
+#   - distribución de puntajes
+# La memoria no crece con el tamaño del diario: los acumuladores dependen de la
+# cantidad de preguntas y opciones, y de cada jugador sólo se recuerda su
+# partida en curso (como mucho MAX_ACTIVE_PLAYERS, LRU). Cuando la partida
+# termina (o el jugador vuelve a empezar, o es desalojado) su fila se entrega a
+# `on_player` y su puntaje pasa a un histograma.
+#
+#   python analitica.py --salida informe/ --formato parquet
+import argparse
+import collections
+import csv
+import os
+import sys
+
+POINTS_PER_CORRECT = 10     # por defecto (CLI); la app pasa su propio POINTS_PER_CORRECT
+MAX_ACTIVE_PLAYERS = 10000   # partidas en curso recordadas a la vez
+MAX_GAP_SECONDS = 600        # una pausa mayor no cuenta como tiempo de respuesta
+TIME_BUCKETS = (5, 10, 15, 20, 30, 40, 50, 60, 90, 120, float("inf"))
+WRITE_BATCH = 1000           # filas por lote al escribir la tabla de jugadores
+FORMATS = ("csv", "parquet")
+
+
+class ReportError(ValueError):
+    """No se pudo generar el informe (p. ej. falta pyarrow para Parquet)."""
+
+
+def _pyarrow():
+    # Parquet es opcional (CSV siempre funciona) y pyarrow es pesado: se importa sólo al pedirlo
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ReportError("instale pyarrow para exportar en Parquet") from None
+    return pa, pq
+
+
+class _QuestionStats:
+    __slots__ = ("answered", "correct", "timeouts", "options", "time_sum", "time_n", "time_hist")
+
+    def __init__(self):
+        self.answered = 0
+        self.correct = 0
+        self.timeouts = 0
+        self.options = collections.Counter()
+        self.time_sum = 0.0
+        self.time_n = 0
+        self.time_hist = [0] * len(TIME_BUCKETS)
+
+    def observe_time(self, seconds):
+        self.time_sum += seconds
+        self.time_n += 1
+        for i, limit in enumerate(TIME_BUCKETS):
+            if seconds <= limit:
+                self.time_hist[i] += 1
+                break
+
+    def time_median(self):
+        # límite superior de la cubeta que contiene la mediana
+        seen = 0
+        for limit, n in zip(TIME_BUCKETS, self.time_hist):
+            seen += n
+            if self.time_n and seen >= self.time_n / 2:
+                return limit if limit != float("inf") else TIME_BUCKETS[-2]
+        return None
+
+
+class RaceAnalytics:
+    def __init__(self, quizzes=None, default_quiz=None, points_per_correct=POINTS_PER_CORRECT,
+                 on_player=None, max_active=MAX_ACTIVE_PLAYERS):
+        self.quizzes = quizzes or {}
+        self.default_quiz = default_quiz
+        self.points_per_correct = points_per_correct
+        self.on_player = on_player
+        self.max_active = max_active
+        self.entries = 0
+        self.players = 0
+        self._questions = {}                         # (quiz, pregunta_idx) -> _QuestionStats
+        self._active = collections.OrderedDict()     # (sala, quiz, jugador) -> partida en curso
+        self._scores = collections.Counter()         # puntos -> partidas
+
+    def _quiz(self, quiz_id):
+        return self.quizzes.get(quiz_id, self.default_quiz)
+
+    def _close(self, key, run):
+        sala, quiz_id, player = key
+        self.players += 1
+        self._scores[run["points"]] += 1
+        if self.on_player:
+            self.on_player({
+                "sala": sala, "quiz": quiz_id, "jugador": player,
+                "puntos": run["points"], "aciertos": run["correct"], "respondidas": run["answered"],
+                "tiempo_medio_s": round(run["time_sum"] / run["time_n"], 2) if run["time_n"] else None,
+            })
+
+    def add(self, entry, sala=""):
+        idx = entry.get("pregunta_idx")
+        if idx is None:
+            return
+        self.entries += 1
+        quiz_id = entry.get("quiz") or getattr(self.default_quiz, "id", None)
+        stats = self._questions.get((quiz_id, idx))
+        if stats is None:
+            stats = self._questions[(quiz_id, idx)] = _QuestionStats()
+        stats.answered += 1
+        correct = bool(entry.get("correct"))
+        if entry.get("timeout"):
+            stats.timeouts += 1
+        else:
+            opt = entry.get("opcion_idx")
+            if opt is None and entry.get("selected") is not None:
+                # registro anterior a opcion_idx: sólo trae el texto elegido
+                q = self._quiz(quiz_id)
+                opt = q.option_index(idx, entry["selected"]) if q else None
+            if opt is not None:
+                stats.options[opt] += 1
+        if correct:
+            stats.correct += 1
+
+        key = (sala, quiz_id, entry.get("jugador"))
+        ts = entry.get("timestamp") or 0
+        run = self._active.pop(key, None)
+        if run is not None and idx <= run["idx"]:
+            self._close(key, run)  # volvió a empezar: es otra partida (p. ej. tras un RESET)
+            run = None
+        if run is None:
+            run = {"idx": -1, "ts": None, "points": 0, "correct": 0, "answered": 0, "time_sum": 0.0, "time_n": 0}
+        elif idx == run["idx"] + 1 and 0 <= ts - run["ts"] <= MAX_GAP_SECONDS:
+            seconds = ts - run["ts"]
+            stats.observe_time(seconds)
+            run["time_sum"] += seconds
+            run["time_n"] += 1
+        run["idx"], run["ts"] = idx, ts
+        run["answered"] += 1
+        if correct:
+            run["correct"] += 1
+            run["points"] += self.points_per_correct
+        self._active[key] = run
+        if len(self._active) > self.max_active:
+            self._close(*self._active.popitem(last=False))
+
+    def feed(self, entries, sala=""):
+        for entry in entries:
+            self.add(entry, sala)
+        return self
+
+    def finish(self):
+        """Cierra las partidas que siguen en curso (llamar al terminar de leer)."""
+        while self._active:
+            self._close(*self._active.popitem(last=False))
+        return self
+
+    # ---------------------------
+    # Tablas del informe
+    # ---------------------------
+    def questions(self):
+        rows = []
+        for (quiz_id, idx), s in sorted(self._questions.items(), key=lambda kv: (str(kv[0][0]), kv[0][1])):
+            q = self._quiz(quiz_id)
+            rows.append({
+                "quiz": quiz_id,
+                "pregunta": idx + 1,
+                "texto": q.questions[idx]["q"] if q and 0 <= idx < q.total else None,
+                "respuestas": s.answered,
+                "aciertos": s.correct,
+                "tasa_acierto": round(s.correct / s.answered, 4) if s.answered else None,
+                "tiempo_agotado": s.timeouts,
+                "tiempo_medio_s": round(s.time_sum / s.time_n, 2) if s.time_n else None,
+                "tiempo_mediana_s": s.time_median(),
+            })
+        return rows
+
+    def distractors(self):
+        rows = []
+        for (quiz_id, idx), s in sorted(self._questions.items(), key=lambda kv: (str(kv[0][0]), kv[0][1])):
+            q = self._quiz(quiz_id)
+            chosen = s.answered - s.timeouts
+            options = range(len(q.options[idx])) if q and 0 <= idx < q.total else sorted(s.options)
+            for opt in options:
+                rows.append({
+                    "quiz": quiz_id,
+                    "pregunta": idx + 1,
+                    "opcion": opt + 1,
+                    "texto": q.option_text(idx, opt) if q else None,
+                    "correcta": q.correct_idx[idx] == opt if q and 0 <= idx < q.total else None,
+                    "elecciones": s.options.get(opt, 0),
+                    "frecuencia": round(s.options.get(opt, 0) / chosen, 4) if chosen else None,
+                })
+        return rows
+
+    def scores(self):
+        return [{"puntos": pts, "jugadores": n} for pts, n in sorted(self._scores.items())]
+
+    def time_histogram(self):
+        totals = [0] * len(TIME_BUCKETS)
+        for s in self._questions.values():
+            totals = [a + b for a, b in zip(totals, s.time_hist)]
+        return [{"hasta_s": "+inf" if limit == float("inf") else limit, "respuestas": n}
+                for limit, n in zip(TIME_BUCKETS, totals)]
+
+
+# ---------------------------
+# Escritura (CSV o Parquet, por lotes)
+# ---------------------------
+class _TableWriter:
+    def __init__(self, path, formato, schema=None):
+        self.path = path
+        self.formato = formato
+        self.schema = schema  # esquema Parquet fijo (si no, se infiere del primer lote)
+        self._batch = []
+        self._file = self._csv = self._parquet = None
+
+    def write(self, row):
+        self._batch.append(row)
+        if len(self._batch) >= WRITE_BATCH:
+            self._flush()
+
+    def _flush(self):
+        if not self._batch:
+            return
+        if self.formato == "parquet":
+            pa, pq = _pyarrow()
+            table = pa.Table.from_pylist(self._batch, schema=self.schema)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, table.schema)
+            self._parquet.write_table(table.cast(self._parquet.schema))
+        else:
+            if self._csv is None:
+                self._file = open(self.path, "w", encoding="utf-8", newline="")
+                self._csv = csv.DictWriter(self._file, fieldnames=list(self._batch[0]))
+                self._csv.writeheader()
+            self._csv.writerows(self._batch)
+        self._batch = []
+
+    def close(self):
+        self._flush()
+        if self._parquet is not None:
+            self._parquet.close()
+        if self._file is not None:
+            self._file.close()
+
+
+def write_table(path, rows, formato="csv"):
+    writer = _TableWriter(path, formato)
+    for row in rows:
+        writer.write(row)
+    writer.close()
+
+
+def export_report(sources, directory, formato="csv", quizzes=None, default_quiz=None,
+                  points_per_correct=POINTS_PER_CORRECT):
+    """Analiza `sources` ([(sala, iterable de respuestas)]) y escribe las tablas en `directory`.
+
+    La tabla de jugadores se escribe mientras se lee el diario, por lotes.
+    Devuelve (RaceAnalytics, [rutas escritas]).
+    """
+    if formato not in FORMATS:
+        raise ReportError(f"formato desconocido: {formato}")
+    os.makedirs(directory, exist_ok=True)
+    path = lambda name: os.path.join(directory, f"{name}.{formato}")  # noqa: E731
+    schema = None
+    if formato == "parquet":
+        pa, _ = _pyarrow()
+        schema = pa.schema([("sala", pa.string()), ("quiz", pa.string()), ("jugador", pa.string()),
+                            ("puntos", pa.int64()), ("aciertos", pa.int64()), ("respondidas", pa.int64()),
+                            ("tiempo_medio_s", pa.float64())])
+    players = _TableWriter(path("jugadores"), formato, schema)
+    analytics = RaceAnalytics(quizzes, default_quiz, points_per_correct, on_player=players.write)
+    try:
+        for sala, entries in sources:
+            analytics.feed(entries, sala)
+        analytics.finish()
+    finally:
+        players.close()
+    written = [path("jugadores")] if analytics.players else []
+    for name, rows in (("preguntas", analytics.questions()), ("distractores", analytics.distractors()),
+                       ("puntajes", analytics.scores()), ("tiempos", analytics.time_histogram())):
+        if rows:
+            write_table(path(name), rows, formato)
+            written.append(path(name))
+    return analytics, written
+
+
+def main(argv=None):
+    from banco_preguntas import load_all
+    from salas import DEFAULT_CODE, get_room, list_rooms
+
+    base = os.path.dirname(os.path.abspath(__file__))
+    ap = argparse.ArgumentParser(description="Informe posterior a la carrera a partir de los diarios de respuestas")
+    ap.add_argument("--dir", default=base, help="directorio del proyecto (con salas/ y answers.jsonl)")
+    ap.add_argument("--sala", action="append", help="código de sala (repetible; por defecto todas)")
+    ap.add_argument("--salida", default="informe", help="directorio donde escribir el informe")
+    ap.add_argument("--formato", choices=FORMATS, default="csv")
+    args = ap.parse_args(argv)
+
+    codes = args.sala or [DEFAULT_CODE] + list_rooms(args.dir)
+    rooms = [r for r in (get_room(args.dir, code) for code in codes) if r is not None]
+    sources = [(r.code, r.log()) for r in rooms]
+    quizzes = load_all(os.path.join(args.dir, "cuestionarios"))
+    try:
+        analytics, written = export_report(sources, args.salida, args.formato, quizzes)
+    except ReportError as e:
+        print(e, file=sys.stderr)
+        return 2
+    print(f"{analytics.entries} respuestas, {analytics.players} partidas, {len(rooms)} salas")
+    for p in written:
+        print(f"  {p}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# banco_preguntas.py — Cuestionarios cargados desde archivos JSON/YAML
+#
+# Cada cuestionario se valida una sola vez al cargarlo y se "compila": las
+# opciones quedan en tuplas y la respuesta correcta de cada pregunta como
+# índice. Así calificar es comparar dos enteros y el diario de respuestas
+# guarda (pregunta_idx, opcion_idx) en lugar de los textos completos.
+#
+# Formato del archivo:
+#   {"id": "...", "titulo": "...",
+#    "preguntas": [{"q": "...", "options": ["...", ...], "correct": "<texto>" | <índice>}, ...]}
+import json
+import os
+import threading
+import time
+
+try:
+    import yaml
+except ImportError:  # YAML es opcional; JSON siempre funciona
+    yaml = None
+
+
+class QuizError(ValueError):
+    """Cuestionario mal formado o imposible de leer."""
+
+
+class Quiz:
+    def __init__(self, quiz_id, title, questions):
+        self.id = quiz_id
+        self.title = title
+        # misma forma que la antigua lista `questions` de carrera.py (q / options / correct)
+        self.questions = tuple(questions)
+        self.options = tuple(q["options"] for q in self.questions)
+        self.correct_idx = tuple(q["options"].index(q["correct"]) for q in self.questions)
+        self.total = len(self.questions)
+
+    def grade(self, question_idx, option_idx):
+        return self.correct_idx[question_idx] == option_idx
+
+    def option_text(self, question_idx, option_idx):
+        try:
+            return self.options[question_idx][option_idx]
+        except (IndexError, TypeError):
+            return None
+
+    def option_index(self, question_idx, text):
+        # registros anteriores al banco externo: sólo guardaban el texto de la opción elegida
+        try:
+            return self.options[question_idx].index(text)
+        except (IndexError, TypeError, ValueError):
+            return None
+
+    def correct_text(self, question_idx):
+        return self.options[question_idx][self.correct_idx[question_idx]]
+
+
+def _validate(raw, source):
+    if not isinstance(raw, dict) or not isinstance(raw.get("preguntas"), list) or not raw["preguntas"]:
+        raise QuizError(f"{source}: se esperaba un objeto con una lista 'preguntas' no vacía")
+    questions = []
+    for n, q in enumerate(raw["preguntas"], start=1):
+        if not isinstance(q, dict):
+            raise QuizError(f"{source}: la pregunta #{n} no es un objeto con 'q', 'options' y 'correct'")
+        text, options, correct = q.get("q"), q.get("options"), q.get("correct")
+        if not isinstance(text, str) or not text.strip():
+            raise QuizError(f"{source}: la pregunta #{n} no tiene texto ('q')")
+        if not isinstance(options, list) or len(options) < 2 or not all(isinstance(o, str) for o in options):
+            raise QuizError(f"{source}: la pregunta #{n} necesita al menos dos opciones de texto")
+        if len(set(options)) != len(options):
+            raise QuizError(f"{source}: la pregunta #{n} tiene opciones repetidas")
+        if isinstance(correct, int) and not isinstance(correct, bool):
+            if not 0 <= correct < len(options):
+                raise QuizError(f"{source}: índice 'correct' fuera de rango en la pregunta #{n}")
+            correct = options[correct]
+        elif correct not in options:
+            raise QuizError(f"{source}: la respuesta correcta de la pregunta #{n} no está entre las opciones")
+        questions.append({"q": text, "options": list(options), "correct": correct})
+    if not isinstance(raw.get("id") or "", str) or not isinstance(raw.get("titulo") or "", str):
+        raise QuizError(f"{source}: 'id' y 'titulo' deben ser texto")
+    quiz_id = raw.get("id") or os.path.splitext(os.path.basename(source))[0]
+    return Quiz(quiz_id, raw.get("titulo") or quiz_id, questions)
+
+
+def _read(path):
+    ext = os.path.splitext(path)[1].lower()
+    yaml_error = yaml.YAMLError if yaml is not None else ()
+    try:
+        with open(path, "r", encoding="utf-8-sig") as f:
+            if ext in (".yaml", ".yml"):
+                if yaml is None:
+                    raise QuizError(f"{path}: instale PyYAML para cargar cuestionarios YAML")
+                return yaml.safe_load(f)
+            return json.load(f)
+    except (OSError, ValueError, yaml_error) as e:
+        raise QuizError(f"{path}: {e}") from e
+
+
+# Varios cuestionarios en caché a la vez, por ruta; se recompilan si el archivo cambia.
+_quizzes = {}
+_quizzes_lock = threading.Lock()
+
+
+def load_quiz(path):
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError as e:
+        raise QuizError(f"{path}: {e}") from e
+    with _quizzes_lock:
+        cached = _quizzes.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+    quiz = _validate(_read(path), path)
+    with _quizzes_lock:
+        _quizzes[path] = (mtime, quiz)
+    return quiz
+
+
+def quiz_files(directory):
+    """Rutas de los cuestionarios disponibles en un directorio."""
+    try:
+        names = sorted(os.listdir(directory))
+    except FileNotFoundError:
+        return []
+    return [os.path.join(directory, n) for n in names
+            if os.path.splitext(n)[1].lower() in (".json", ".yaml", ".yml")]
+
+
+# load_all() se llama en cada rerun: el directorio se vuelve a recorrer (listdir +
+# stat de cada archivo) como mucho cada RESCAN_SECONDS por proceso.
+RESCAN_SECONDS = 5.0
+_dirs = {}
+
+
+def load_all(directory, max_age=RESCAN_SECONDS):
+    """{id: Quiz} con todos los cuestionarios del directorio (los inválidos se omiten)."""
+    now = time.monotonic()
+    with _quizzes_lock:
+        cached = _dirs.get(directory)
+        if cached and now - cached[0] < max_age:
+            return cached[1]
+    quizzes = {}
+    for path in quiz_files(directory):
+        try:
+            quiz = load_quiz(path)
+        except QuizError:
+            continue
+        quizzes.setdefault(quiz.id, quiz)
+    with _quizzes_lock:
+        _dirs[directory] = (now, quizzes)
+    return quizzes
@@ -0,0 +1,150 @@
+# benchmarks/arranque.py — Arranque en frío: tiempo de importación y primer render
+#
+# Cada medición corre en un proceso nuevo (como un worker recién creado por el
+# autoescalado) sobre una copia temporal del proyecto, para no tocar el estado
+# real. En el proceso hijo se mide:
+#   importación -> módulos de la app y sus dependencias (streamlit, pandas, ...)
+#   1.er render  -> primera ejecución de carrera.py con streamlit.testing (AppTest)
+#   rerun        -> segunda ejecución, ya con todo importado y en caché
+# para el camino del jugador (se une a la sala principal con la carrera ya
+# iniciada, así mide el render de la pregunta y no la espera de la sala, que
+# duerme LONG_POLL_SECONDS a propósito) y el del admin (sesión autenticada).
+# También informa si pandas quedó cargado en el camino
+# del jugador, que no lo necesita. Sale con código 1 si alguna ejecución falló.
+#
+#   python benchmarks/arranque.py --repeticiones 5
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = ("jugador", "admin")
+# módulos cuyo costo de importación se informa por separado (en este orden)
+MODULES = ("streamlit", "streamlit_autorefresh", "pandas",
+           "estado", "respuestas", "presencia", "salas", "banco_preguntas", "reloj", "ranking",
+           "analitica", "vistas", "metricas")
+# lo que no debe copiarse al proyecto temporal (estado, diarios y salas de la instalación real)
+IGNORE = shutil.ignore_patterns(".git", "__pycache__", "salas", "state.*", "answers.*", "presence.json",
+                                "benchmarks", "informe")
+
+
+def child(path, workdir):
+    sys.path.insert(0, workdir)
+    os.chdir(workdir)
+    report = {"camino": path, "importacion_ms": {}}
+    t0 = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    report["importacion_ms"]["streamlit.testing"] = (time.perf_counter() - t0) * 1000
+
+    at = AppTest.from_file(os.path.join(workdir, "carrera.py"), default_timeout=60)
+    if path == "admin":
+        at.session_state["admin_authenticated"] = True
+    t0 = time.perf_counter()
+    at.run()
+    if path == "jugador":
+        at.text_input(key="player_name_input").input("arranque").run()
+    report["primer_render_ms"] = (time.perf_counter() - t0) * 1000
+    t0 = time.perf_counter()
+    at.run()
+    report["rerun_ms"] = (time.perf_counter() - t0) * 1000
+    report["errores"] = [e.value for e in at.exception]
+    report["pandas_cargado"] = "pandas" in sys.modules
+    return report
+
+
+def start_race(workdir):
+    # fuera de la medición (proceso aparte): escribe "inicio" en el estado de la sala principal
+    # con el mismo backend que usará carrera.py
+    sys.path.insert(0, workdir)
+    from salas import DEFAULT_CODE, get_room
+    coordination = os.environ.get("CARRERA_COORDINACION", "")
+    backend = os.environ.get("CARRERA_STATE_BACKEND",
+                             "sqlite" if coordination not in ("", "memoria") else "diferido")
+    store = get_room(workdir, DEFAULT_CODE, backend).store()
+    store.transaction(lambda fs: fs.update(inicio=time.time()))
+    if hasattr(store, "flush"):
+        store.flush()
+
+
+def import_costs(workdir):
+    # costo acumulado de cada módulo con -X importtime, en un intérprete limpio
+    code = "; ".join(f"import {m}" for m in MODULES)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=workdir,
+                          capture_output=True, text=True)
+    costs = {}
+    for line in proc.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"
+        parts = [p.strip() for p in line.split("|")]
+        if len(parts) == 3 and parts[2] in MODULES and parts[1].isdigit():
+            costs[parts[2]] = int(parts[1]) / 1000
+    return costs
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Mide el arranque en frío de carrera.py (jugador y admin)")
+    ap.add_argument("--repeticiones", type=int, default=3)
+    ap.add_argument("--json", action="store_true", help="imprimir el informe como JSON")
+    ap.add_argument("--hijo", choices=PATHS + ("iniciar",), help=argparse.SUPPRESS)
+    ap.add_argument("--dir", help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.hijo == "iniciar":
+        start_race(args.dir)
+        return 0
+    if args.hijo:
+        print(json.dumps(child(args.hijo, args.dir)))
+        return 0
+
+    report = {"repeticiones": args.repeticiones, "caminos": {}}
+    with tempfile.TemporaryDirectory(prefix="carrera-arranque-") as tmp:
+        workdir = os.path.join(tmp, "app")
+        shutil.copytree(BASE_DIR, workdir, ignore=IGNORE)
+        report["importacion_ms"] = import_costs(workdir)
+        for path in PATHS:
+            runs = []
+            for _ in range(args.repeticiones):
+                # cada repetición empieza sin estado, como un worker nuevo
+                for name in os.listdir(workdir):
+                    if name.startswith(("state.", "answers.", "presence.")):
+                        os.remove(os.path.join(workdir, name))
+                if path == "jugador":
+                    subprocess.run([sys.executable, os.path.abspath(__file__), "--hijo", "iniciar", "--dir", workdir],
+                                   check=True)
+                proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--hijo", path, "--dir", workdir],
+                                      capture_output=True, text=True)
+                if proc.returncode != 0:
+                    print(proc.stderr, file=sys.stderr)
+                    return 1
+                runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+            report["caminos"][path] = {
+                "streamlit_ms": round(statistics.median(r["importacion_ms"]["streamlit.testing"] for r in runs), 1),
+                "primer_render_ms": round(statistics.median(r["primer_render_ms"] for r in runs), 1),
+                "rerun_ms": round(statistics.median(r["rerun_ms"] for r in runs), 1),
+                "pandas_cargado": any(r["pandas_cargado"] for r in runs),
+                "errores": sorted({e for r in runs for e in r["errores"]}),
+            }
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"Arranque en frío (mediana de {args.repeticiones} procesos)")
+        for path, r in report["caminos"].items():
+            print(f"  {path:<8} streamlit={r['streamlit_ms']} ms  1.er render={r['primer_render_ms']} ms  "
+                  f"rerun={r['rerun_ms']} ms  pandas={'sí' if r['pandas_cargado'] else 'no'}")
+            for e in r["errores"]:
+                print(f"           error: {e}")
+        if report["importacion_ms"]:
+            print("  importación (acumulada, ms): " + ", ".join(
+                f"{m}={report['importacion_ms'][m]:.1f}" for m in MODULES if m in report["importacion_ms"]))
+    # pandas se informa pero no hace fallar: algunas versiones de streamlit lo importan por su cuenta
+    return 1 if any(r["errores"] for r in report["caminos"].values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,261 @@
+# benchmarks/carga.py — Prueba de carga: N jugadores simultáneos contra la persistencia
+#
+# Reproduce, sin navegador, lo que hace cada rerun de carrera.py para un jugador:
+#   latido  -> presence.claim + load_versioned del estado (+ registro la 1.ª vez)
+#   envío   -> latido + append al diario de respuestas + update(jugador) transaccional
+# Cada jugador es un hilo (Streamlit ejecuta cada sesión en su propio hilo), late
+# cada --heartbeat-ms y contesta tras un tiempo de reflexión aleatorio.
+#
+# Informa p50/p99 de latencia por tipo de rerun, volumen de E/S del proceso y
+# actualizaciones perdidas (puntos esperados vs. guardados, respuestas enviadas
+# vs. registradas). Sale con código 1 si se perdió alguna actualización.
+#
+# Con --procesos N los jugadores se reparten entre N procesos (como N workers
+# de Streamlit) que comparten la sala a través del coordinador (coordinacion.py):
+# la presencia y el aviso de inicio de carrera pasan por él.
+#
+#   python benchmarks/carga.py --jugadores 200 --reflexion 2 --backend sqlite
+#   python benchmarks/carga.py --jugadores 400 --procesos 4 --backend sqlite
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import secrets
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from banco_preguntas import load_quiz  # noqa: E402
+from coordinacion import get_coordinator  # noqa: E402
+from estado import BACKENDS  # noqa: E402
+from eventos import wait_until  # noqa: E402
+from salas import create_room, get_room  # noqa: E402
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUIZ_FILE = os.path.join(BASE_DIR, "cuestionarios", "ia_sistemas.json")
+
+# mismos valores que carrera.py
+POINTS_PER_CORRECT = 10
+ACTIVE_THRESHOLD = 6
+HEARTBEAT_MS = 2000
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {"latido": [], "envio": []}
+        self.errors = 0
+
+    def record(self, kind, seconds):
+        with self._lock:
+            self.latencies[kind].append(seconds)
+
+    def error(self):
+        with self._lock:
+            self.errors += 1
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def process_io():
+    # bytes leídos/escritos por el proceso (Linux); None si no está disponible
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(": ") for line in f.read().splitlines())
+        return int(fields["rchar"]), int(fields["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def heartbeat(sala, name, token):
+    if not sala.presence().claim(name, token, ACTIVE_THRESHOLD):
+        raise RuntimeError(f"{name}: bloqueado por otra sesión")
+    _, fs = sala.store().load_versioned()
+    if name not in fs.get("players_info", {}):
+        def registrar(p, fs_hb):
+            if p.get("joined") is None:
+                p["joined"] = time.time()
+        sala.store().update(name, registrar)
+        _, fs = sala.store().load_versioned()
+    return fs
+
+
+def submit(sala, quiz, name, idx, option):
+    correcto = quiz.grade(idx, option)
+    sala.log().append({"timestamp": int(time.time()), "jugador": name, "quiz": quiz.id,
+                       "pregunta_idx": idx, "opcion_idx": option, "correct": correcto})
+
+    def puntuar(p, fs_upd):
+        if correcto:
+            p["points"] = p.get("points", 0) + POINTS_PER_CORRECT
+            p["aciertos"] = p.get("aciertos", 0) + 1
+        p["preg"] = p.get("preg", 0) + 1
+        if p["preg"] >= quiz.total:
+            p["fin"] = True
+            p["tiempo"] = int(time.time() - (fs_upd.get("inicio") or time.time()))
+    sala.store().update(name, puntuar)
+    return correcto
+
+
+def player(i, sala, quiz, args, stats, wait_start, expected):
+    name = f"jugador{i:04d}"
+    token = secrets.token_hex(8)
+    rng = random.Random(args.semilla + i)
+    hb = args.heartbeat_ms / 1000
+    points = 0
+
+    def timed(kind, fn, *a):
+        t0 = time.perf_counter()
+        try:
+            return fn(*a)
+        except Exception:
+            stats.error()
+        finally:
+            stats.record(kind, time.perf_counter() - t0)
+
+    timed("latido", heartbeat, sala, name, token)
+    while not wait_start(hb):
+        timed("latido", heartbeat, sala, name, token)
+    for idx in range(quiz.total):
+        due = time.monotonic() + rng.expovariate(1 / args.reflexion) if args.reflexion > 0 else 0
+        while time.monotonic() < due:
+            time.sleep(min(hb, max(0.0, due - time.monotonic())))
+            timed("latido", heartbeat, sala, name, token)
+        option = rng.randrange(len(quiz.options[idx]))
+
+        def envio():
+            heartbeat(sala, name, token)
+            return submit(sala, quiz, name, idx, option)
+        if timed("envio", envio):
+            points += POINTS_PER_CORRECT
+    expected[name] = points
+
+
+def run_players(sala, quiz, args, indices, wait_start):
+    """Corre los jugadores `indices` como hilos; devuelve (latencias, errores, puntos esperados, E/S)."""
+    stats, expected = Stats(), {}
+    io_before = process_io()
+    threads = [threading.Thread(target=player, args=(i, sala, quiz, args, stats, wait_start, expected), daemon=True)
+               for i in indices]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    io_after = process_io()
+    sala.log().flush()
+    if hasattr(sala.store(), "flush"):
+        sala.store().flush()
+    io = None if io_before is None or io_after is None else [b - a for a, b in zip(io_before, io_after)]
+    return stats.latencies, stats.errors, expected, io
+
+
+def worker(k, args, workdir, code):
+    # un proceso "worker": abre la misma sala a través del coordinador compartido
+    sala = get_room(workdir, code, args.backend, get_coordinator(args.coordinacion))
+    quiz = load_quiz(QUIZ_FILE)
+
+    def wait_start(timeout):
+        return wait_until(sala.store(), lambda fs: fs.get("inicio"), timeout, changes=sala.changes())
+    return run_players(sala, quiz, args, range(k, args.jugadores, args.procesos), wait_start)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Simula jugadores concurrentes contra la persistencia de carrera.py")
+    ap.add_argument("--jugadores", type=int, default=100)
+    ap.add_argument("--reflexion", type=float, default=1.0, help="segundos medios de reflexión por pregunta")
+    ap.add_argument("--heartbeat-ms", type=int, default=HEARTBEAT_MS)
+    ap.add_argument("--backend", choices=sorted(BACKENDS), default="json")
+    ap.add_argument("--procesos", type=int, default=1, help="procesos worker entre los que repartir los jugadores")
+    ap.add_argument("--coordinacion", help="coordinador compartido (ruta .db o 'memoria'); "
+                                           "con --procesos > 1 por defecto <dir>/coordinacion.db")
+    ap.add_argument("--semilla", type=int, default=0)
+    ap.add_argument("--dir", help="directorio de trabajo (por defecto uno temporal que se borra)")
+    ap.add_argument("--json", action="store_true", help="imprimir el informe como JSON")
+    args = ap.parse_args(argv)
+    if args.procesos > 1 and args.backend == "diferido":
+        ap.error("el backend 'diferido' no admite varios procesos (use sqlite o json)")
+    if args.procesos > 1 and args.coordinacion == "memoria":
+        ap.error("el coordinador 'memoria' no se comparte entre procesos")
+
+    workdir = args.dir or tempfile.mkdtemp(prefix="carrera-carga-")
+    if args.procesos > 1 and not args.coordinacion:
+        args.coordinacion = os.path.join(workdir, "coordinacion.db")
+    quiz = load_quiz(QUIZ_FILE)
+    sala = create_room(workdir, args.backend, quiz_id=quiz.id, coordinator=get_coordinator(args.coordinacion))
+
+    t0 = time.perf_counter()
+    if args.procesos > 1:
+        with multiprocessing.get_context("spawn").Pool(args.procesos) as pool:
+            pending = pool.starmap_async(worker, [(k, args, workdir, sala.code) for k in range(args.procesos)])
+            time.sleep(args.heartbeat_ms / 1000 + 1.0)  # los workers arrancan, se unen y laten
+            sala.store().transaction(lambda fs: fs.update(inicio=time.time(), organizer="carga"))
+            sala.broadcast()
+            results = pending.get()
+    else:
+        started = threading.Event()
+        runner = threading.Thread(target=lambda: results.append(
+            run_players(sala, quiz, args, range(args.jugadores), started.wait)))
+        results = []
+        runner.start()
+        time.sleep(args.heartbeat_ms / 1000)  # todos se unen y laten al menos una vez
+        sala.store().transaction(lambda fs: fs.update(inicio=time.time(), organizer="carga"))
+        started.set()
+        runner.join()
+    elapsed = time.perf_counter() - t0
+
+    latencies = {"latido": [], "envio": []}
+    errors, expected, io = 0, {}, [0, 0]
+    for lat, err, exp, proc_io in results:
+        for kind, values in lat.items():
+            latencies[kind].extend(values)
+        errors += err
+        expected.update(exp)
+        io = None if io is None or proc_io is None else [a + b for a, b in zip(io, proc_io)]
+
+    fs = sala.store().load()
+    saved = {n: p.get("points", 0) for n, p in fs.get("players_info", {}).items()}
+    lost_points = sum(1 for n, pts in expected.items() if saved.get(n) != pts)
+    lost_answers = args.jugadores * quiz.total - len(sala.log().load())
+    report = {
+        "jugadores": args.jugadores,
+        "backend": args.backend,
+        "procesos": args.procesos,
+        "duracion_s": round(elapsed, 2),
+        "reruns": {kind: len(v) for kind, v in latencies.items()},
+        "latencia_ms": {
+            kind: {"p50": round(percentile(v, 50) * 1000, 2), "p99": round(percentile(v, 99) * 1000, 2)}
+            for kind, v in latencies.items()
+        },
+        "io_bytes": None if io is None else {"leidos": io[0], "escritos": io[1]},
+        "jugadores_con_puntos_perdidos": lost_points,
+        "respuestas_perdidas": lost_answers,
+        "errores": errors,
+    }
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"{report['jugadores']} jugadores, backend {report['backend']}, "
+              f"{report['procesos']} proceso(s), {report['duracion_s']} s")
+        for kind, lat in report["latencia_ms"].items():
+            print(f"  {kind:<7} reruns={report['reruns'][kind]:<7} p50={lat['p50']} ms  p99={lat['p99']} ms")
+        if report["io_bytes"]:
+            print(f"  E/S: {report['io_bytes']['leidos']} B leídos, {report['io_bytes']['escritos']} B escritos")
+        print(f"  puntos perdidos: {lost_points} jugadores, respuestas perdidas: {lost_answers}, "
+              f"errores: {errors}")
+    if not args.dir:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 1 if lost_points or lost_answers else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
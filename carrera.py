@@ -1,143 +1,164 @@
 # carrera.py — Versión final corregida:
 # feedback 3s + muestra respuesta correcta + animación continuar + bloqueo multi-tab
 import streamlit as st
+import streamlit.components.v1 as components
 import time
-import pandas as pd
 import os
-import json
 import secrets
-from datetime import timedelta
-from streamlit_autorefresh import st_autorefresh
+import sqlite3
+import functools
+import tempfile
+import zipfile
+from estado import default_state
+from eventos import wait_until
+from coordinacion import get_coordinator
+from banco_preguntas import QuizError, load_all, load_quiz
+from salas import DEFAULT_CODE, create_room, get_room, list_rooms
+import metricas
+from reloj import expire_question, get_clock
+from ranking import get_ranking
+from analitica import RaceAnalytics, export_report
+from vistas import ESTILOS, barra_html, format_ts, pregunta_md
+
+# primer comando de Streamlit (antes de los estilos y de cualquier st.error de la configuración)
+st.set_page_config(page_title="Formulario IA y Sistemas Cibernéticos", layout="wide")
 
 # ---------------------------
 # Config
 # ---------------------------
 BASE_DIR = os.path.dirname(__file__)
-STATE_FILE = os.path.join(BASE_DIR, "state.json")
-ANSWERS_FILE = os.path.join(BASE_DIR, "answers.json")
-
-QUESTION_TIME = 50  # segundos por pregunta (referencia)
+# coordinación entre workers (coordinacion.py): vacío = un solo proceso; ruta a un .db
+# (SQLite WAL compartido) para varios procesos de Streamlit detrás de un balanceador;
+# "memoria" = sustituto dentro del proceso (pruebas)
+COORDINATION = os.environ.get("CARRERA_COORDINACION", "")
+# backend del estado: "diferido" (en memoria; un hilo vuelca state.json + diario, un solo
+# proceso), "json" (state.json con candado) o "sqlite" (state.db en modo WAL)
+STATE_BACKEND = os.environ.get("CARRERA_STATE_BACKEND",
+                               "sqlite" if COORDINATION not in ("", "memoria") else "diferido")
+# Cada sala (salas.py) tiene sus propios archivos: state.json / state.db, answers.jsonl
+# (answers.json es el formato anterior y se migra solo) y presence.json (heartbeats).
+# La sala principal (código vacío) usa los de la raíz del proyecto.
+
+QUESTION_TIME = 50  # segundos por pregunta (lo hace cumplir reloj.py: al vencer se envía "tiempo agotado")
 CONTINUE_DELAY = 1
 POINTS_PER_CORRECT = 10
 ACTIVE_THRESHOLD = 6   # segundos para considerar "activo" en admin (y para bloqueo multi-tab)
-AUTOREFRESH_MS = 500   # ms (auto-refresh)
+ROSTER_REFRESH_SECONDS = 5  # la columna "Última actividad" del admin se recalcula como máximo cada N s
+AUDIT_PAGE_SIZE = 50        # filas de auditoría enviadas al navegador por página
+LEADERBOARD_TOP_K = 5       # primeros puestos que ve cada jugador
+AUTOREFRESH_MS = 500   # ms (auto-refresh del panel admin)
+HEARTBEAT_MS = 2000    # ms: refresco mínimo de un jugador (mantiene el latido < ACTIVE_THRESHOLD)
+LONG_POLL_SECONDS = 2  # s que una sesión en espera duerme aguardando el inicio de la carrera
 FEEDBACK_SECONDS = 3   # segundos que se muestra el feedback antes de habilitar "Continuar"
+# archivo donde se exportan las métricas (.prom = texto Prometheus, otro = JSON); vacío = no exportar.
+# Con varios workers, "{pid}" en la ruta da un archivo por proceso.
+METRICS_FILE = os.environ.get("CARRERA_METRICS_FILE", "").replace("{pid}", str(os.getpid()))
+METRICS_EXPORT_SECONDS = 5
 
 # ---------------------------
-# Preguntas
+# Preguntas (banco externo en cuestionarios/, validado y compilado una vez por proceso)
 # ---------------------------
-questions = [
-    {"q":"¿Cuál es el propósito central de la inteligencia artificial según Russell y Norvig (2021)?",
-     "options":["Reemplazar completamente al ser humano en todas las tareas",
-                "Crear sistemas que imiten emociones humanas",
-                "Construir agentes capaces de actuar racionalmente en un entorno",
-                "Desarrollar máquinas con conciencia propia"],
-     "correct":"Construir agentes capaces de actuar racionalmente en un entorno"},
-
-    {"q":"Los sistemas cibernéticos se caracterizan principalmente por:",
-     "options":["Procesos de control, retroalimentación y comunicación",
-                "La capacidad de almacenar grandes volúmenes de datos",
-                "La sustitución de tareas humanas por robots",
-                "La creación de redes sociales digitales"],
-     "correct":"Procesos de control, retroalimentación y comunicación"},
-
-    {"q":"Según Brynjolfsson y McAfee (2016), uno de los principales riesgos de la automatización laboral es:",
-     "options":["La reducción de costos operativos",
-                "El aumento de la precisión en tareas repetitivas",
-                "La mejora en la calidad de los servicios",
-                "El desplazamiento de empleos tradicionales"],
-     "correct":"El desplazamiento de empleos tradicionales"},
-
-    {"q":"El sesgo algorítmico en la inteligencia artificial ocurre cuando:",
-     "options":["Los sistemas carecen de supervisión humana",
-                "Los algoritmos aprenden de datos históricos con prejuicios",
-                "Se utilizan demasiados recursos computacionales",
-                "Los usuarios no aceptan términos de privacidad"],
-     "correct":"Los algoritmos aprenden de datos históricos con prejuicios"},
-
-    {"q":"Castells (2013) afirma que en la sociedad contemporánea la comunicación en red es el espacio donde se construyen:",
-     "options":["Exclusivamente vínculos económicos",
-                "Relaciones de poder, identidad y participación social",
-                "Procesos de automatización laboral",
-                "Sistemas de retroalimentación tecnológica"],
-     "correct":"Relaciones de poder, identidad y participación social"},
-
-    {"q":"Tufekci (2015) sostiene que los algoritmos de redes sociales tienden a priorizar:",
-     "options":["Contenidos que generan mayor interacción emocional",
-                "Información científica y verificada",
-                "Publicaciones neutrales y objetivas",
-                "Mensajes institucionales regulados"],
-     "correct":"Contenidos que generan mayor interacción emocional"},
-
-    {"q":"Wardle y Derakhshan (2017) denominan al fenómeno de la desinformación digital como:",
-     "options":["Fake news",
-                "Data bias",
-                "Information disorder",
-                "Digital misinformation"],
-     "correct":"Information disorder"},
-
-    {"q":"Según la UNESCO (2021), para lograr una verdadera inclusión digital es necesario considerar:",
-     "options":["La creación de más redes sociales globales",
-                "La sustitución de docentes por plataformas digitales",
-                "Exclusivamente la reducción de costos tecnológicos",
-                "Alfabetización tecnológica, asequibilidad, conectividad y accesibilidad"],
-     "correct":"Alfabetización tecnológica, asequibilidad, conectividad y accesibilidad"}
-]
-TOTAL_QUESTIONS = len(questions)
+QUIZ_DIR = os.path.join(BASE_DIR, "cuestionarios")
+QUIZ_FILE = os.path.join(QUIZ_DIR, "ia_sistemas.json")  # cuestionario por defecto
+try:
+    quiz = load_quiz(QUIZ_FILE)
+except (OSError, QuizError) as e:
+    st.error(f"No se pudo cargar el cuestionario: {e}")
+    st.stop()
+TOTAL_QUESTIONS = quiz.total
+
+def quiz_for(fs):
+    # cuestionario elegido para la sala (o el de por defecto)
+    return load_all(QUIZ_DIR).get(fs.get("quiz"), quiz) if fs.get("quiz") else quiz
+
+if COORDINATION not in ("", "memoria") and STATE_BACKEND == "diferido":
+    st.error("El backend 'diferido' guarda el estado en memoria de un proceso: "
+             "con varios workers use CARRERA_STATE_BACKEND=sqlite o json.")
+    st.stop()
+try:
+    coordinador = get_coordinator(COORDINATION)
+except sqlite3.Error as e:
+    st.error(f"No se pudo abrir la coordinación compartida {COORDINATION}: {e}")
+    st.stop()
+
+def room(code=DEFAULT_CODE):
+    return get_room(BASE_DIR, code, STATE_BACKEND, coordinador)
+
+def pandas():
+    # pandas sólo lo usa el panel admin: se importa la primera vez que hace falta, así un
+    # proceso nuevo que sólo atiende jugadores arranca sin pagar su importación
+    import pandas as pd
+    return pd
+
+def st_autorefresh(**kwargs):
+    # el componente se registra al importarlo por primera vez (no en el arranque del proceso)
+    from streamlit_autorefresh import st_autorefresh as autorefresh
+    return autorefresh(**kwargs)
 
 # ---------------------------
 # Persistencia
 # ---------------------------
-def load_state():
-    try:
-        with open(STATE_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {"inicio": None, "jugadores": [], "players_info": {}, "organizer": None}
-
-def save_state(data):
-    try:
-        with open(STATE_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        st.error(f"Error guardando state.json: {e}")
-
-def load_answers():
-    try:
-        with open(ANSWERS_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return []
-
-def save_answers(data):
-    try:
-        with open(ANSWERS_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        st.error(f"Error guardando answers.json: {e}")
-
-def append_answer(entry):
-    answers = load_answers()
-    answers.append(entry)
-    save_answers(answers)
+def load_state(sala):
+    # caché del proceso: sólo se parsea si el archivo cambió. ¡No mutar el dict devuelto!
+    return load_state_versioned(sala)[1]
+
+def load_state_versioned(sala):
+    with metricas.timed("load_state"):
+        try:
+            return sala.store().load_versioned()
+        except Exception:
+            return -1, default_state()
+
+def save_state(sala, data):
+    with metricas.timed("save_state"):
+        try:
+            sala.store().save(data)
+        except Exception as e:
+            st.error(f"Error guardando {os.path.basename(sala.state_file)}: {e}")
+
+def update_state(sala, fn):
+    # transacción sobre todo el estado de la sala: fn(fs) se aplica bajo candado al estado más reciente
+    with metricas.timed("update_state"):
+        try:
+            return sala.store().transaction(fn)
+        except Exception as e:
+            st.error(f"Error guardando {os.path.basename(sala.state_file)}: {e}")
+
+def update_player(sala, name, fn, create=True):
+    # transacción sobre un jugador: fn(pinfo, fs); devuelve el registro actualizado
+    # (None si create=False y el jugador ya no existe, p. ej. tras un RESET)
+    with metricas.timed("update_player"):
+        try:
+            return sala.store().update(name, fn, create=create)
+        except Exception as e:
+            st.error(f"Error guardando {os.path.basename(sala.state_file)}: {e}")
+
+def answers_version(sala):
+    # lectura incremental: sólo se parsean las respuestas nuevas, y no se copia el diario
+    with metricas.timed("answers_version"):
+        try:
+            return sala.log().current_version()
+        except Exception:
+            return -1
+
+def reset_answers(sala):
+    with metricas.timed("reset_answers"):
+        try:
+            sala.log().clear()
+        except Exception as e:
+            st.error(f"Error vaciando answers.jsonl: {e}")
+
+def append_answer(sala, entry):
+    # O(1): una línea anexada al diario, sin releer ni reescribir el historial
+    with metricas.timed("append_answer"):
+        try:
+            sala.log().append(entry)
+        except Exception as e:
+            st.error(f"Error guardando answers.jsonl: {e}")
 
 # ---------------------------
 # Helpers
 # ---------------------------
-def ensure_player_structure(fs, name):
-    fs.setdefault("players_info", {})
-    pinfo = fs["players_info"].setdefault(name, {
-        "points": 0,
-        "aciertos": 0,
-        "preg": 0,
-        "fin": False,
-        "tiempo": None,
-        "joined": time.time(),
-        "last_seen": time.time(),
-        # session_token se añadirá cuando el jugador se registre
-    })
-    return pinfo
-
 def format_seconds_to_mmss(s):
     try:
         s = int(s)
@@ -147,62 +168,326 @@ def format_seconds_to_mmss(s):
     ss = s % 60
     return f"{mm:02d}:{ss:02d}"
 
-def barra_progreso(player_points, preguntas_respondidas):
-    progreso = player_points / (POINTS_PER_CORRECT * TOTAL_QUESTIONS) if TOTAL_QUESTIONS>0 else 0
-    progreso = min(1.0, max(0.0, progreso))
-    left_percent = max(2, min(98, int(progreso*100)))
-    # barra + contador numérico a la derecha
-    html = f"""
-    <div style="display:flex;align-items:center;gap:12px;">
-      <div style="flex:1;position:relative;height:40px;background:#111;border-radius:10px;padding:6px;overflow:hidden;border:1px solid #333;">
-          <div style="position:absolute;left:0;top:0;height:100%;width:{progreso*100}%;background:rgba(34,197,94,0.18);border-radius:8px;transition:width .4s ease;"></div>
-          <div style="position:absolute;left:{left_percent}%;top:4px;font-size:22px;transform:translateX(-50%);transition:left .4s ease;">🛸</div>
-          <div style="position:absolute;right:10px;top:8px;font-size:18px;">🌕</div>
-      </div>
-      <div style="min-width:120px;text-align:right;font-weight:700;color:#cfe8d8;">
-        {preguntas_respondidas} / {TOTAL_QUESTIONS}
-      </div>
-    </div>
+def barra_progreso(player_points, preguntas_respondidas, total=TOTAL_QUESTIONS):
+    t_barra = time.perf_counter()
+    # el HTML se arma una vez por (puntos, pregunta, total) en vistas.py
+    st.markdown(barra_html(player_points, preguntas_respondidas, total, POINTS_PER_CORRECT),
+                unsafe_allow_html=True)
+    metricas.observe("render.barra", time.perf_counter() - t_barra)
+
+def programar_refresco(fase, sala=None, despertar=None):
+    """Decide cuándo vuelve a ejecutarse el script según la fase de la sesión.
+
+    Sólo el panel admin sondea rápido. Un jugador refresca al ritmo del latido y,
+    si hay un plazo del servidor (`despertar`: fin de la pregunta o del feedback),
+    el navegador programa el rerun para ese momento: el hilo de la sesión no
+    duerme. La única espera del lado del servidor es la de la sala de espera,
+    acotada a LONG_POLL_SECONDS, para que el inicio de la carrera llegue al
+    instante (allí no hay entradas del jugador que queden detrás). Las cuentas
+    regresivas se animan en el navegador.
     """
-    st.markdown(html, unsafe_allow_html=True)
+    if st.session_state.admin_authenticated:
+        st_autorefresh(interval=AUTOREFRESH_MS, key="auto_refresh")
+        return
+    if fase is None:
+        return  # sin nombre no hay nada que refrescar
+    interval = HEARTBEAT_MS
+    if despertar:
+        # no esperar más que el plazo para mostrar el "tiempo agotado" o el botón "Continuar"
+        interval = max(250, min(interval, int((despertar - time.time()) * 1000) + 250))
+    st_autorefresh(interval=interval, key="auto_refresh")
+    if fase == "waiting":
+        if wait_until(sala.store(), lambda fs_w: fs_w.get("inicio"), LONG_POLL_SECONDS, changes=sala.changes()):
+            st.rerun()
+
+def asegurar_limite(sala, nombre, jugador, idx, quiz_sala):
+    """Plazo (epoch) para contestar la pregunta idx; lo fija el servidor la primera vez que se muestra."""
+    limite = jugador.get("limite") if jugador.get("limite_preg") == idx else None
+    if not limite:
+        def fijar(p, fs_l):
+            if p.get("limite_preg") != idx or not p.get("limite"):
+                p["limite_preg"] = idx
+                p["limite"] = time.time() + QUESTION_TIME
+        limite = (update_player(sala, nombre, fijar, create=False) or {}).get("limite") or time.time() + QUESTION_TIME
+    # el reloj del proceso aplica el vencimiento aunque el navegador no vuelva a ejecutarse
+    get_clock().schedule(limite, (sala.code, nombre, idx), functools.partial(
+        expire_question, sala, nombre, idx, quiz_sala.total, FEEDBACK_SECONDS, quiz_sala.id))
+    return limite
+
+def cuenta_regresiva(hasta, etiqueta, duracion):
+    # cuenta regresiva animada en el navegador (JS): no requiere reruns para avanzar. El HTML
+    # sólo lleva el plazo absoluto (epoch ms) y la duración, así que es idéntico en cada rerun
+    # del latido y Streamlit no recrea el iframe (la animación no se reinicia); el resto se
+    # calcula en JS con el reloj del navegador
+    components.html(f"""
+    <div style="font:600 15px sans-serif;color:#cfe8d8;margin-bottom:4px;" id="cr">{etiqueta}</div>
+    <div style="height:6px;background:#222;border-radius:4px;overflow:hidden;">
+      <div id="cr-barra" style="height:100%;background:#22c55e;width:0;transition:width .25s linear;"></div>
+    </div>
+    <script>
+      const fin = {int(hasta * 1000)}, duracion = {max(duracion, 1) * 1000};
+      (function tick() {{
+        const ms = Math.max(0, fin - Date.now());
+        document.getElementById("cr").textContent = "{etiqueta} " + Math.ceil(ms / 1000) + " s";
+        document.getElementById("cr-barra").style.width = Math.min(100, ms / duracion * 100) + "%";
+        if (ms > 0) setTimeout(tick, 250);
+      }})();
+    </script>
+    """, height=42)
+
+# reruns parciales: con st.fragment (Streamlit >= 1.37) elegir una opción sólo vuelve a
+# ejecutar la pregunta, no el latido, la barra ni la clasificación; sin él, rerun completo
+fragmento = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda fn: fn)
+
+@fragmento
+def responder_pregunta(sala, nombre, idx, quiz_sala):
+    total_sala = quiz_sala.total
+    radio_key = f"radio_{nombre}_{idx}"
+    # mantener selección previa si la hay (la selección es el índice de la opción)
+    opciones = quiz_sala.options[idx]
+    st.session_state.selection = st.radio("Selecciona una opción:", range(len(opciones)),
+                                          format_func=opciones.__getitem__, key=radio_key)
+    submit_key = f"submit_{nombre}_{idx}"
+    if st.button("Enviar respuesta", key=submit_key):
+        selected = st.session_state.get("selection", None)
+        if selected is None:
+            st.warning("Seleccione una opción antes de enviar.")
+        else:
+            correcto = quiz_sala.grade(idx, selected)
+            aceptado = []
+
+            # actualizar jugador y persistir en una sola transacción (incremento de preg aquí)
+            def puntuar(p, fs_upd):
+                ahora = time.time()
+                # el servidor manda: fuera de plazo (o pregunta ya cerrada) no se acepta
+                if p.get("fin") or p.get("preg", 0) != idx:
+                    return
+                if p.get("limite_preg") == idx and p.get("limite") and ahora > p["limite"]:
+                    return
+                aceptado.append(True)
+                p["ultima"] = ahora  # desempate de la clasificación
+                p["limite"] = None
+                p["feedback_hasta"] = ahora + FEEDBACK_SECONDS
+                if correcto:
+                    p["points"] = p.get("points", 0) + POINTS_PER_CORRECT
+                    p["aciertos"] = p.get("aciertos", 0) + 1
+                # incrementar pregunta contestada (guardamos el progreso)
+                p["preg"] = p.get("preg", 0) + 1
+                # si terminó
+                if p["preg"] >= total_sala:
+                    p["fin"] = True
+                    p["tiempo"] = int(time.time() - (fs_upd.get("inicio") or time.time()))
+            update_player(sala, nombre, puntuar, create=False)
+            if aceptado:
+                append_answer(sala, {
+                    "timestamp": int(time.time()),
+                    "jugador": nombre,
+                    "quiz": quiz_sala.id,
+                    "pregunta_idx": idx,
+                    "opcion_idx": selected,
+                    "correct": correcto
+                })
+            else:
+                expire_question(sala, nombre, idx, total_sala, FEEDBACK_SECONDS, quiz_sala.id)
+
+            # Guardar feedback en sesión local (asegura que se muestre)
+            if not aceptado:
+                st.session_state.feedback_type = "timeout"
+            else:
+                st.session_state.feedback_type = "correct" if correcto else "incorrect"
+            st.session_state.feedback_start = time.time()
+            st.session_state.feedback_correct_answer = quiz_sala.correct_text(idx)
+
+            # cambiar modo a feedback (ocultar pregunta)
+            st.session_state.mode = "feedback"
+            # fuerza re-ejecución para que la UI muestre feedback ya
+            st.rerun()
 
 # ---------------------------
-# Estilos / animación para botones (simple, afecta botones de Streamlit)
+# Panel admin: vistas memoizadas por versión del estado
 # ---------------------------
-st.markdown(
-    """
-    <style>
-    /* Pulso sutil para botones (continuar se verá animado) */
-    .stButton>button {
-      transition: transform .14s ease-in-out, box-shadow .14s ease-in-out;
-      border-radius: 8px;
-      padding: 8px 18px;
-    }
-    .stButton>button:hover {
-      transform: translateY(-2px) scale(1.02);
-      box-shadow: 0 10px 24px rgba(0,0,0,0.12);
-    }
-    /* animación de pulso (glow) */
-    @keyframes pulseGlow {
-      0% { box-shadow: 0 0 0 0 rgba(34,197,94,0.35); }
-      70% { box-shadow: 0 0 0 10px rgba(34,197,94,0); }
-      100% { box-shadow: 0 0 0 0 rgba(34,197,94,0); }
-    }
-    /* aplicamos glow al último botón en el contenedor .continue-area si existe */
-    .continue-area .stButton>button {
-      animation: pulseGlow 1.8s infinite;
-      border: 2px solid rgba(34,197,94,0.12);
-    }
-    </style>
-    """, unsafe_allow_html=True
-)
+# Las tablas sólo se reconstruyen cuando cambia la versión del estado / de las
+# respuestas, el conjunto de jugadores activos, o (para "Última actividad")
+# cada ROSTER_REFRESH_SECONDS. st.cache_data las comparte entre todos los
+# admins conectados al proceso.
+@st.cache_data(max_entries=8, show_spinner=False)
+def roster_df(room_code, state_version, activos, bucket):
+    sala = room(room_code)
+    fs_r = load_state(sala)
+    presence_seen = sala.presence().snapshot()
+    activos = set(activos)
+    players_list = []
+    for name, info in fs_r.get("players_info", {}).items():
+        players_list.append({
+            "Jugador": name,
+            "Estado": "🟢 Activo" if name in activos else "🔴 Desconectado",
+            "Aciertos": info.get("aciertos", 0),
+            "Puntos": info.get("points", 0),
+            "Se unió": format_ts(int(info.get("joined") or 0)),
+            "Última actividad": format_ts(int(presence_seen.get(name, info.get("last_seen", 0)))),
+        })
+    if not players_list:
+        return None
+    return pandas().DataFrame(players_list).sort_values(["Estado","Jugador"], ascending=[False, True])
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def leaderboard_df(room_code, ranking_version):
+    # orden completo para el admin, ya mantenido por ranking.py (sin ordenar aquí)
+    sala = room(room_code)
+    players = load_state(sala).get("players_info", {})
+    rows = []
+    for pos, name in enumerate(get_ranking(sala).ordering(), start=1):
+        info = players.get(name, {})
+        rows.append({
+            "Pos": pos,
+            "Jugador": name,
+            "Puntos": info.get("points", 0),
+            "Aciertos": info.get("aciertos", 0),
+            "Tiempo": format_seconds_to_mmss(info["tiempo"]) if info.get("fin") else "—",
+        })
+    return pandas().DataFrame(rows) if rows else None
+
+def mostrar_clasificacion(sala, nombre, players):
+    ranking = get_ranking(sala)
+    pos = ranking.rank(nombre)
+    if pos is None:
+        return
+    top = " · ".join(f"{i}. {n} ({players.get(n, {}).get('points', 0)} pts)"
+                     for i, n in enumerate(ranking.top(LEADERBOARD_TOP_K), start=1))
+    st.caption(f"🏆 Tu posición: **#{pos}** de {len(ranking)}  —  {top}")
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def roster_csv(room_code, state_version, activos, bucket):
+    return roster_df(room_code, state_version, activos, bucket).to_csv(index=False).encode("utf-8")
+
+AUDIT_COLUMNS = ["hora","jugador","pregunta_idx","selected","correct"]
+
+def audit_row(entry, quizzes, default_quiz=quiz):
+    row = dict(entry)
+    row["hora"] = format_ts(int(entry.get("timestamp") or 0))
+    if "selected" not in row:
+        # registros compactos: (pregunta_idx, opcion_idx) -> texto de la opción
+        q = quizzes.get(entry.get("quiz"), default_quiz)
+        row["selected"] = q.option_text(entry.get("pregunta_idx"), entry.get("opcion_idx"))
+    return row
+
+def archivo_descarga(escribir):
+    # escribir(f) vuelca el contenido a un archivo temporal; se devuelve reabierto en modo
+    # lectura (io.BufferedReader), que st.download_button acepta (un TemporaryFile no).
+    # El archivo se borra enseguida: el descriptor abierto sigue siendo válido.
+    fd, path = tempfile.mkstemp(prefix="carrera-")
+    try:
+        with os.fdopen(fd, "w+b") as f:
+            escribir(f)
+        return open(path, "rb")
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # Windows no borra un archivo abierto: queda en el directorio temporal
+
+def audit_csv_file(sala):
+    # CSV completo escrito por streaming a un archivo temporal (no se arma en memoria)
+    quizzes = load_all(QUIZ_DIR)
+    default_quiz = quiz_for(load_state(sala))
+    return archivo_descarga(lambda f: sala.log().export_csv(
+        f, AUDIT_COLUMNS, lambda entry: audit_row(entry, quizzes, default_quiz)))
+
+def panel_rendimiento():
+    # métricas del proceso (todas las sesiones y salas): latencias, E/S y reruns
+    pd = pandas()
+    snap = metricas.METRICS.snapshot()
+    if snap["latencias"]:
+        st.sidebar.dataframe(pd.DataFrame([
+            {"Operación": name, "Llamadas": h["count"], "Media (ms)": round(h["mean_ms"], 2),
+             "p50 (ms)": h["p50_ms"], "p99 (ms)": h["p99_ms"]}
+            for name, h in snap["latencias"].items()
+        ]), height=220)
+    io_rows = [{"Recurso": k, "Bytes": v} for k, v in snap["io_bytes"].items()]
+    if io_rows:
+        st.sidebar.dataframe(pd.DataFrame(io_rows), height=150)
+    reruns = snap["reruns"]
+    minutos = max(1e-9, (time.time() - snap["desde"]) / 60)
+    st.sidebar.caption(f"{reruns['total']} reruns, {reruns['sesiones']} sesiones activas "
+                       f"({reruns['total'] / minutos:.0f}/min desde el inicio del proceso)")
+    if METRICS_FILE:
+        st.sidebar.caption(f"Exportando cada {METRICS_EXPORT_SECONDS} s a `{METRICS_FILE}`")
+    if st.sidebar.button("Reiniciar métricas"):
+        metricas.METRICS.reset()
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def analisis_sala(room_code, answers_version):
+    # una pasada en streaming sobre el diario de la sala; sólo se repite si llegaron respuestas
+    sala = room(room_code)
+    a = RaceAnalytics(load_all(QUIZ_DIR), quiz_for(load_state(sala)), POINTS_PER_CORRECT)
+    a.feed(sala.log(), room_code).finish()
+    return a.questions(), a.distractors(), a.scores(), a.players
+
+def informe_zip(sala):
+    # tablas del informe (CSV) escritas por streaming y empaquetadas en un zip temporal
+    def escribir(f):
+        with tempfile.TemporaryDirectory() as d:
+            _, written = export_report([(sala.code, sala.log())], d, "csv", load_all(QUIZ_DIR),
+                                       quiz_for(load_state(sala)), POINTS_PER_CORRECT)
+            with zipfile.ZipFile(f, "w", zipfile.ZIP_DEFLATED) as z:
+                for path in written:
+                    z.write(path, os.path.basename(path))
+    return archivo_descarga(escribir)
+
+def panel_analisis(sala):
+    pd = pandas()
+    preguntas, distractores, puntajes, partidas = analisis_sala(sala.code, answers_version(sala))
+    if not preguntas:
+        st.sidebar.info("Sin respuestas para analizar todavía.")
+        return
+    varios = len({r["quiz"] for r in preguntas}) > 1
+    etiqueta = lambda r: f"{r['quiz']} P{r['pregunta']}" if varios else f"P{r['pregunta']}"  # noqa: E731
+    st.sidebar.caption(f"{partidas} partidas analizadas")
+    st.sidebar.markdown("**Tasa de acierto por pregunta**")
+    st.sidebar.bar_chart(pd.DataFrame({"tasa de acierto": [r["tasa_acierto"] for r in preguntas]},
+                                      index=[etiqueta(r) for r in preguntas]))
+    elegida = st.sidebar.selectbox("Distractores de", [etiqueta(r) for r in preguntas], key="analisis_pregunta")
+    opciones = [r for r in distractores if etiqueta(r) == elegida]
+    st.sidebar.bar_chart(pd.DataFrame({"elecciones": [r["elecciones"] for r in opciones]},
+                                      index=[r["texto"] or f"Opción {r['opcion']}" for r in opciones]))
+    st.sidebar.markdown("**Distribución de puntajes**")
+    st.sidebar.bar_chart(pd.DataFrame({"jugadores": [r["jugadores"] for r in puntajes]},
+                                      index=[r["puntos"] for r in puntajes]))
+    st.sidebar.dataframe(pd.DataFrame(preguntas)[["pregunta", "tasa_acierto", "tiempo_agotado", "tiempo_medio_s"]],
+                         height=200, hide_index=True)
+    lazy_download("Exportar informe (CSV)", f"export_report_{sala.code}", lambda: informe_zip(sala), "informe.zip",
+                  mime="application/zip")
+
+def lazy_download(label, flag, make_data, file_name, mime="text/csv"):
+    # el archivo sólo se genera cuando el admin lo pide (una vez), no en cada rerun;
+    # `flag` incluye el código de sala para no ofrecer en una sala el archivo de otra
+    if st.sidebar.button(label, key=f"prep_{flag}"):
+        st.session_state[flag] = None
+        try:
+            st.session_state[flag] = make_data()
+        except Exception as e:
+            st.sidebar.error(f"No se pudo generar {file_name}: {e}")
+    data = st.session_state.get(flag)
+    if data is not None:
+        if hasattr(data, "seek"):
+            data.seek(0)
+        try:
+            descargado = st.sidebar.download_button(f"⬇️ Descargar {file_name}", data=data, file_name=file_name,
+                                                    mime=mime, key=f"dl_{flag}")
+        except Exception:
+            st.session_state[flag] = None  # que el siguiente rerun no vuelva a fallar igual
+            raise
+        if descargado:
+            st.session_state[flag] = None
 
 # ---------------------------
-# Inicialización
+# Estilos / animación para botones (hoja compactada una vez por proceso en vistas.py)
 # ---------------------------
-st.set_page_config(page_title="Formulario IA y Sistemas Cibernéticos", layout="wide")
-st_autorefresh(interval=AUTOREFRESH_MS, key="auto_refresh")
+st.markdown(ESTILOS, unsafe_allow_html=True)
 
+# ---------------------------
+# Inicialización
+# ---------------------------
 # session_state seguros
 if "admin_authenticated" not in st.session_state:
     st.session_state.admin_authenticated = False
@@ -212,8 +497,6 @@ if "show_next" not in st.session_state:
     st.session_state.show_next = False
 if "selection" not in st.session_state:
     st.session_state.selection = None
-if "answers" not in st.session_state:
-    st.session_state.answers = load_answers()
 # Estado local por jugador en la sesión (asegura que la notificación siempre se muestre)
 if "mode" not in st.session_state:
     st.session_state.mode = None  # "question" o "feedback"
@@ -225,11 +508,15 @@ if "feedback_correct_answer" not in st.session_state:
     st.session_state.feedback_correct_answer = None
 if "my_token" not in st.session_state:
     st.session_state.my_token = None
+if "metrics_sid" not in st.session_state:
+    st.session_state.metrics_sid = secrets.token_hex(4)  # id anónimo para contar reruns por sesión
+metricas.METRICS.rerun(st.session_state.metrics_sid)
+t_rerun = time.perf_counter()
 
 # ---------------------------
 # Sidebar: Admin
 # ---------------------------
-fs = load_state()
+t_admin = time.perf_counter()
 st.sidebar.header("Administrador")
 
 if not st.session_state.admin_authenticated:
@@ -242,49 +529,75 @@ if not st.session_state.admin_authenticated:
         else:
             st.sidebar.error("Credenciales incorrectas")
 else:
-    organizer = st.sidebar.text_input("Nombre de quien inicia el programa:", value=fs.get("organizer") or "")
+    # salas: cada clase juega en su propia sala con su código, cuestionario y archivos
+    quiz_ids = sorted(load_all(QUIZ_DIR)) or [quiz.id]
+    nuevo_quiz = st.sidebar.selectbox("Cuestionario para una sala nueva", quiz_ids,
+                                      index=quiz_ids.index(quiz.id) if quiz.id in quiz_ids else 0)
+    if st.sidebar.button("➕ Crear sala nueva"):
+        try:
+            nueva = create_room(BASE_DIR, STATE_BACKEND, quiz_id=nuevo_quiz, coordinator=coordinador)
+            st.session_state.admin_room = nueva.code
+            st.sidebar.success(f"Sala creada. Código de juego: **{nueva.code}**")
+        except Exception as e:
+            st.sidebar.error(f"No se pudo crear la sala: {e}")
+    room_codes = [DEFAULT_CODE] + list_rooms(BASE_DIR)
+    if st.session_state.get("admin_room") not in room_codes:
+        st.session_state.admin_room = DEFAULT_CODE
+    admin_code = st.sidebar.selectbox("Sala", room_codes, key="admin_room",
+                                      format_func=lambda c: room(c).label)
+    sala_admin = room(admin_code)
+    fs = load_state(sala_admin)
+    st.sidebar.caption(f"Cuestionario: {quiz_for(fs).title}")
+    error_volcado = getattr(sala_admin.store(), "last_error", None)
+    if error_volcado:
+        # el backend diferido guarda en segundo plano: sus fallos se ven aquí y se reintentan
+        st.sidebar.error(f"Error guardando {os.path.basename(sala_admin.state_file)}: {error_volcado}")
+
+    organizer = st.sidebar.text_input("Nombre de quien inicia el programa:", value=fs.get("organizer") or "",
+                                      key=f"organizer_{admin_code}")
 
     st.sidebar.markdown("### 👥 Jugadores registrados")
-    players_list = []
-    for name, info in fs.get("players_info", {}).items():
-        joined_ts = info.get("joined", None)
-        joined_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(joined_ts)) if joined_ts else "—"
-        last_seen = info.get("last_seen", 0)
-        last_seen_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(last_seen)) if last_seen else "—"
-        activo = (time.time() - last_seen) < ACTIVE_THRESHOLD
-        players_list.append({
-            "Jugador": name,
-            "Estado": "🟢 Activo" if activo else "🔴 Desconectado",
-            "Aciertos": info.get("aciertos", 0),
-            "Puntos": info.get("points", 0),
-            "Se unió": joined_str,
-            "Última actividad": last_seen_str
-        })
+    state_version = load_state_versioned(sala_admin)[0]
+    now_ts = time.time()
+    activos = tuple(sorted(n for n, ts in sala_admin.presence().snapshot().items()
+                           if now_ts - ts < ACTIVE_THRESHOLD))
+    roster_key = (admin_code, state_version, activos, int(now_ts // ROSTER_REFRESH_SECONDS))
+    df_players = roster_df(*roster_key)
 
-    if players_list:
-        df_players = pd.DataFrame(players_list).sort_values(["Estado","Jugador"], ascending=[False, True])
+    if df_players is not None:
         st.sidebar.dataframe(df_players, height=260)
-        csv = df_players.to_csv(index=False).encode("utf-8")
-        st.sidebar.download_button("Exportar jugadores (CSV)", data=csv, file_name="jugadores.csv", mime="text/csv")
+        lazy_download("Exportar jugadores (CSV)", f"export_players_{admin_code}",
+                      lambda: roster_csv(*roster_key), "jugadores.csv")
     else:
         st.sidebar.info("No hay jugadores registrados aún")
 
+    st.sidebar.markdown("### 🏆 Clasificación")
+    df_rank = leaderboard_df(admin_code, get_ranking(sala_admin).version)
+    if df_rank is not None:
+        st.sidebar.dataframe(df_rank, height=220, hide_index=True)
+    else:
+        st.sidebar.info("Sin jugadores todavía")
+
     if st.sidebar.button("🚀 Iniciar carrera (confirmar todos conectados)"):
         if not organizer.strip():
             st.sidebar.warning("Ingrese el nombre del organizador antes de iniciar.")
         else:
-            fs_local = load_state()
-            fs_local["inicio"] = time.time()
-            fs_local["organizer"] = organizer
-            save_state(fs_local)
+            def iniciar(fs_local):
+                fs_local["inicio"] = time.time()
+                fs_local["organizer"] = organizer
+            update_state(sala_admin, iniciar)
+            sala_admin.broadcast()  # despierta a las salas de espera de todos los workers
             st.session_state.show_next = True
             st.session_state.current_question = 0
             st.session_state.selection = None
             st.sidebar.success("Carrera iniciada")
 
     if st.sidebar.button("🧹 Eliminar registro (RESET)"):
-        save_state({"inicio": None, "jugadores": [], "players_info": {}, "organizer": None})
-        save_answers([])
+        limpio = default_state()
+        if fs.get("quiz"):
+            limpio["quiz"] = fs["quiz"]  # la sala conserva su cuestionario
+        save_state(sala_admin, limpio)
+        reset_answers(sala_admin)
         st.session_state.current_question = 0
         st.session_state.show_next = False
         st.session_state.selection = None
@@ -292,64 +605,101 @@ else:
         st.session_state.feedback_start = 0
         st.session_state.feedback_correct_answer = None
         st.session_state.my_token = None
+        sala_admin.presence().clear()
+        sala_admin.broadcast()
         st.sidebar.success("Registros eliminados")
 
     st.sidebar.markdown("### 🗂 Auditoría (respuestas)")
-    answers = load_answers()
-    if answers:
-        df_a = pd.DataFrame(answers)
-        if "timestamp" in df_a.columns:
-            df_a = df_a.copy()
-            df_a["hora"] = pd.to_datetime(df_a["timestamp"], unit="s").dt.strftime("%Y-%m-%d %H:%M:%S")
-        cols = [c for c in ["hora","jugador","pregunta_idx","selected","correct"] if c in df_a.columns]
-        st.sidebar.dataframe(df_a[cols].sort_values(by="hora", ascending=False).reset_index(drop=True), height=200)
-        csv2 = df_a[cols].to_csv(index=False).encode("utf-8")
-        st.sidebar.download_button("Exportar auditoría (CSV)", data=csv2, file_name="auditoria.csv", mime="text/csv")
+    # ventana paginada servida desde los índices del diario: sólo viaja la página visible
+    log = sala_admin.log()
+    audit_players = log.players()
+    if audit_players:
+        f_jugador = st.sidebar.selectbox("Jugador", ["(todos)"] + audit_players, key="audit_player")
+        f_pregunta = st.sidebar.selectbox("Pregunta", ["(todas)"] + [i + 1 for i in log.question_indices()],
+                                          key="audit_question")
+        filtros = {
+            "jugador": None if f_jugador == "(todos)" else f_jugador,
+            "pregunta_idx": None if f_pregunta == "(todas)" else f_pregunta - 1,
+        }
+        total, _ = log.query(**filtros, limit=0)
+        pages = max(1, -(-total // AUDIT_PAGE_SIZE))
+        page = st.sidebar.number_input("Página", min_value=1, max_value=pages, value=1, step=1, key="audit_page")
+        page = min(int(page), pages)
+        _, rows = log.query(**filtros, offset=(page - 1) * AUDIT_PAGE_SIZE, limit=AUDIT_PAGE_SIZE)
+        quizzes = load_all(QUIZ_DIR)
+        df_a = pandas().DataFrame([audit_row(r, quizzes, quiz_for(fs)) for r in rows])
+        st.sidebar.dataframe(df_a[[c for c in AUDIT_COLUMNS if c in df_a.columns]], height=200)
+        st.sidebar.caption(f"{total} registros — página {page} / {pages} (más recientes primero)")
+        lazy_download("Exportar auditoría (CSV)", f"export_audit_{admin_code}",
+                      lambda: audit_csv_file(sala_admin), "auditoria.csv")
     else:
         st.sidebar.info("No hay registros de auditoría aún.")
 
+    if st.sidebar.checkbox("📊 Análisis de la carrera", key="show_analytics"):
+        panel_analisis(sala_admin)
+
+    if st.sidebar.checkbox("📈 Rendimiento", key="show_perf"):
+        panel_rendimiento()
+metricas.observe("render.admin", time.perf_counter() - t_admin)
+
 # ---------------------------
 # Main: Jugador
 # ---------------------------
+t_jugador = time.perf_counter()
 st.header("Formulario de Inteligencia Artificial y Sistemas Cibernéticos")
+codigo_sala = st.text_input("Código de la sala (vacío = sala principal):", key="room_code_input")
 nombre = st.text_input("Ingresa tu nombre para unirte:", key="player_name_input")
 
+# fase de la sesión (decide el refresco al final del script) y próximo plazo del servidor
+fase = None
+despertar = None
+# la sesión sólo toca los archivos de su propia sala
+sala = room(codigo_sala)
+if sala is None:
+    st.warning("No existe una sala con ese código. Verifíquelo con el organizador.")
+    nombre = None
+elif st.session_state.get("player_room", sala.code) != sala.code:
+    # cambió de sala: el progreso local de la sesión pertenece a la sala anterior
+    st.session_state.mode = None
+    st.session_state.feedback_type = None
+    st.session_state.feedback_start = 0
+if sala is not None:
+    st.session_state.player_room = sala.code
+
 # Si el usuario ingresó nombre
 if nombre and nombre.strip():
     nombre = nombre.strip()
-    fs = load_state()
-
-    # bloqueo multi-tab: si existe otra sesión activa para este nombre (last_seen reciente) y no coincide el token actual,
-    # DENEGAR nueva sesión hasta que la anterior expire por inactividad.
-    existing = fs.get("players_info", {}).get(nombre)
-    now_ts = time.time()
-
-    if existing:
-        existing_token = existing.get("session_token")
-        existing_last = existing.get("last_seen", 0)
-        # si hay token y la última actividad es reciente y este cliente no tiene el mismo token => bloquear
-        if existing_token and (now_ts - existing_last) < ACTIVE_THRESHOLD and st.session_state.get("my_token") != existing_token:
-            st.warning("⚠️ Ya hay otra sesión activa con ese nombre. Espere a que termine o use otro nombre.")
-            st.stop()  # detenemos para que no se muestre la UI del jugador
-
     # asignar token si no existe en session_state (esto distingue pestañas)
     if not st.session_state.get("my_token"):
         st.session_state.my_token = secrets.token_hex(16)  # token de sesión local
 
-    # asegurar estructura del jugador en el JSON
-    if nombre not in fs.get("jugadores", []):
-        fs.setdefault("jugadores", []).append(nombre)
-    pinfo = ensure_player_structure(fs, nombre)
-
-    # registrar/actualizar token en estado persistente
-    pinfo["session_token"] = st.session_state.my_token
-    # actualizar last_seen (heartbeat)
-    pinfo["last_seen"] = now_ts
-    fs["players_info"][nombre] = pinfo
-    save_state(fs)
+    # heartbeat + bloqueo multi-tab: si existe otra sesión activa para este nombre (last_seen reciente)
+    # con otro token, DENEGAR nueva sesión hasta que la anterior expire por inactividad.
+    # El latido va a presencia.py (memoria + archivo lateral), no a state.json.
+    with metricas.timed("presence_claim"):
+        propia = sala.presence().claim(nombre, st.session_state.my_token, ACTIVE_THRESHOLD)
+    if not propia:
+        st.warning("⚠️ Ya hay otra sesión activa con ese nombre. Espere a que termine o use otro nombre.")
+        programar_refresco("blocked", sala)
+        st.stop()  # detenemos para que no se muestre la UI del jugador
+
+    # asegurar estructura del jugador en el JSON (sólo se escribe la primera vez)
+    fs = load_state(sala)
+    if nombre not in fs.get("players_info", {}):
+        def registrar(p, fs_hb):
+            # el registro (jugadores.py) ya nace con puntos/preguntas en cero;
+            # last_seen y session_token viven en presencia.py, no en el estado
+            if p.get("joined") is None:
+                p["joined"] = time.time()
+        update_player(sala, nombre, registrar)
+        fs = load_state(sala)
+
+    # cuestionario de la sala
+    quiz_sala = quiz_for(fs)
+    total_sala = quiz_sala.total
 
     inicio_global = fs.get("inicio", None)
-    jugador = fs["players_info"][nombre]
+    jugador = fs["players_info"].get(nombre, {})
 
     # asegurar valores en st.session_state
     if "player_name" not in st.session_state:
@@ -364,12 +714,10 @@ if nombre and nombre.strip():
             st.session_state.selection = None
             st.session_state.mode = "question"
 
-    # recalcular estado por seguridad
-    fs_main = load_state()
-    inicio_global = fs_main.get("inicio", None)
-
     # mostrar barra UNA sola vez (arriba)
-    barra_progreso(jugador.get("points", 0), jugador.get("preg", 0))
+    barra_progreso(jugador.get("points", 0), jugador.get("preg", 0), total_sala)
+    if inicio_global:
+        mostrar_clasificacion(sala, nombre, fs.get("players_info", {}))
 
     # -------------------------
     # Lógica de preguntas / feedback
@@ -379,80 +727,55 @@ if nombre and nombre.strip():
         # proteger índice
         if idx < 0:
             idx = 0
-        if idx >= TOTAL_QUESTIONS:
-            idx = TOTAL_QUESTIONS - 1
-        qdata = questions[idx]
+        if idx >= total_sala:
+            idx = total_sala - 1
+        qdata = quiz_sala.questions[idx]
 
         # MODO: mostrar pregunta activa
         if st.session_state.mode == "question":
-            st.subheader(f"Pregunta #{idx+1} / {TOTAL_QUESTIONS}")
-            st.write(qdata["q"])
-            radio_key = f"radio_{nombre}_{idx}"
-            # mantener selección previa si la hay
-            st.session_state.selection = st.radio("Selecciona una opción:", qdata["options"], key=radio_key)
-
-            submit_key = f"submit_{nombre}_{idx}"
-            if st.button("Enviar respuesta", key=submit_key):
-                selected = st.session_state.get("selection", None)
-                if selected is None:
-                    st.warning("Seleccione una opción antes de enviar.")
-                else:
-                    correcto = (selected == qdata["correct"])
-                    entry = {
-                        "timestamp": int(time.time()),
-                        "jugador": nombre,
-                        "pregunta_idx": idx,
-                        "selected": selected,
-                        "correct": correcto
-                    }
-                    append_answer(entry)
-
-                    # actualizar jugador local y persistir inmediatamente (incremento de preg aquí)
-                    fs_upd = load_state()
-                    p = fs_upd["players_info"].get(nombre, {})
-                    if correcto:
-                        p["points"] = p.get("points", 0) + POINTS_PER_CORRECT
-                        p["aciertos"] = p.get("aciertos", 0) + 1
-                    # incrementar pregunta contestada (guardamos el progreso)
-                    p["preg"] = p.get("preg", 0) + 1
-                    # si terminó
-                    if p["preg"] >= TOTAL_QUESTIONS:
-                        p["fin"] = True
-                        p["tiempo"] = int(time.time() - fs_upd.get("inicio", time.time()))
-                    fs_upd["players_info"][nombre] = p
-                    save_state(fs_upd)
-
-                    # Guardar feedback en sesión local (asegura que se muestre)
-                    st.session_state.feedback_type = "correct" if correcto else "incorrect"
-                    st.session_state.feedback_start = time.time()
-                    st.session_state.feedback_correct_answer = qdata["correct"]
-
-                    # cambiar modo a feedback (ocultar pregunta)
-                    st.session_state.mode = "feedback"
-                    # fuerza re-ejecución para que la UI muestre feedback ya
-                    st.rerun()
+            fase = "question"
+            limite = asegurar_limite(sala, nombre, jugador, idx, quiz_sala)
+            if jugador.get("preg", 0) > idx or time.time() >= limite:
+                # tiempo agotado: lo aplicó el reloj del servidor o se aplica ahora (idempotente)
+                expire_question(sala, nombre, idx, total_sala, FEEDBACK_SECONDS, quiz_sala.id)
+                st.session_state.feedback_type = "timeout"
+                st.session_state.feedback_start = time.time()
+                st.session_state.feedback_correct_answer = quiz_sala.correct_text(idx)
+                st.session_state.mode = "feedback"
+                st.rerun()
+            despertar = limite
+            st.markdown(pregunta_md(idx, total_sala, qdata["q"]))
+            cuenta_regresiva(limite, "⏱ Tiempo restante:", QUESTION_TIME)
+            responder_pregunta(sala, nombre, idx, quiz_sala)
 
         elif st.session_state.mode == "feedback":
             # Mostrar feedback y temporizador
-            elapsed = time.time() - st.session_state.feedback_start
-            remaining = max(0, FEEDBACK_SECONDS - int(elapsed))
+            fase = "feedback"
+            # el fin del feedback lo fija el servidor al registrar el envío
+            hasta = jugador.get("feedback_hasta") or (st.session_state.feedback_start + FEEDBACK_SECONDS)
+            remaining = hasta - time.time()
 
             if st.session_state.feedback_type == "correct":
                 st.success("✅ Correcto (+10 pts)")
+            elif st.session_state.feedback_type == "timeout":
+                st.warning("⏰ Tiempo agotado")
+                st.info(f"Respuesta correcta: **{st.session_state.feedback_correct_answer}**")
             else:
                 st.error("❌ Incorrecto")
                 st.info(f"Respuesta correcta: **{st.session_state.feedback_correct_answer}**")
 
             if remaining > 0:
-                st.info(f"Continuando en {remaining} s...")
+                cuenta_regresiva(hasta, "Continuando en", FEEDBACK_SECONDS)
+                despertar = hasta
                 # no mostrar botón aún
             else:
+                fase = "question"  # esperando el clic en "Continuar"
                 # mostrar botón continuar con animación
                 cont_col = st.container()
                 cont_col.markdown('<div class="continue-area"></div>', unsafe_allow_html=True)
                 if cont_col.button("Continuar a la siguiente pregunta"):
                     # sincronizar current_question con progreso guardado (p['preg'] se incrementó al enviar)
-                    fs_adv = load_state()
+                    fs_adv = load_state(sala)
                     p = fs_adv["players_info"].get(nombre, {})
                     st.session_state.current_question = p.get("preg", st.session_state.current_question)
                     # limpiar feedback y volver a modo pregunta si no finalizó
@@ -464,20 +787,31 @@ if nombre and nombre.strip():
                         st.session_state.selection = None
                     else:
                         st.session_state.mode = None
-                        st.success("Has terminado la carrera. ¡Buen trabajo!")
+                    # ya no hay sondeo rápido que muestre el cambio: re-ejecutar ahora
+                    st.rerun()
 
         else:
             # modo desconocido -> asegurar reinicio a pregunta
             st.session_state.mode = "question"
+            st.rerun()
 
     elif nombre and jugador.get("fin", False):
         # Mostrar pantalla final (sin duplicar la barra arriba)
+        fase = "done"
         st.success("Has terminado la carrera. ¡Buen trabajo!")
         if jugador.get("tiempo") is not None:
             st.info(f"Tiempo total: {format_seconds_to_mmss(jugador.get('tiempo'))}")
     else:
+        fase = "waiting"
         st.info("⏳ Esperando que el organizador inicie la carrera...")
 
+metricas.observe("render.jugador", time.perf_counter() - t_jugador)
+
 st.caption("Nota: El panel administrador requiere iniciar sesión")
 st.caption("Desarrollado por Kendall Quirós Hernández — versión final (2025)")
 st.caption("Fuentes de las preguntas disponibles bajo solicitud.")  
+
+metricas.observe("rerun", time.perf_counter() - t_rerun)
+metricas.maybe_export(METRICS_FILE, METRICS_EXPORT_SECONDS)
+
+programar_refresco(fase, sala, despertar)
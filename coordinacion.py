@@ -0,0 +1,206 @@
+# coordinacion.py — Coordinación entre varios procesos de carrera.py
+#
+# Con un solo proceso, la presencia (presencia.py) y los avisos de cambio
+# (eventos.py) viven en memoria. Para poner varios workers de Streamlit detrás
+# de un balanceador, eso tiene que ser compartido:
+#   presencia -> quién está conectado y con qué token; claim() es atómico, así
+#                el bloqueo multi-pestaña (ACTIVE_THRESHOLD) vale entre workers
+#   eventos   -> contador por sala que se incrementa al iniciar o reiniciar la
+#                carrera; las sesiones en espera de cualquier worker lo vigilan
+# Los puntajes ya son atómicos entre procesos con el backend "sqlite" (o
+# "json", con candado de archivo) de estado.py; el backend "diferido" guarda el
+# estado en memoria y por eso no sirve con varios workers.
+#
+# SqliteCoordinator usa un archivo SQLite en modo WAL visible para todos los
+# workers; MemoryCoordinator implementa lo mismo dentro de un proceso (pruebas,
+# o un único worker). get_coordinator() elige según la configuración:
+#   ""         -> sin coordinación compartida (comportamiento de un solo proceso)
+#   "memoria"  -> MemoryCoordinator
+#   <ruta.db>  -> SqliteCoordinator sobre ese archivo
+import contextlib
+import sqlite3
+import threading
+import time
+
+WAIT_POLL = 0.1   # s entre consultas mientras una sesión espera un evento de otro proceso
+
+
+# ---------------------------
+# Vistas por sala (misma interfaz que presencia.Presence y eventos.ChangeNotifier)
+# ---------------------------
+class RoomPresence:
+    def __init__(self, coordinator, room):
+        self.coordinator = coordinator
+        self.room = room
+
+    def claim(self, name, token, threshold, now=None):
+        return self.coordinator.claim(self.room, name, token, threshold, time.time() if now is None else now)
+
+    def snapshot(self):
+        return self.coordinator.snapshot(self.room)
+
+    def clear(self):
+        self.coordinator.clear(self.room)
+
+    def flush(self):
+        pass  # cada latido ya es visible para los demás procesos
+
+
+class RoomEvents:
+    def __init__(self, coordinator, room):
+        self.coordinator = coordinator
+        self.room = room
+
+    @property
+    def version(self):
+        return self.coordinator.version(self.room)
+
+    def publish(self):
+        return self.coordinator.publish(self.room)
+
+    def wait(self, seen, timeout):
+        return self.coordinator.wait(self.room, seen, timeout)
+
+
+class _Coordinator:
+    def presence(self, room):
+        return RoomPresence(self, room)
+
+    def events(self, room):
+        return RoomEvents(self, room)
+
+
+# ---------------------------
+# SQLite WAL compartido
+# ---------------------------
+class SqliteCoordinator(_Coordinator):
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._tx() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS presence ("
+                       "room TEXT NOT NULL, name TEXT NOT NULL, token TEXT, last_seen REAL NOT NULL, "
+                       "PRIMARY KEY (room, name))")
+            db.execute("CREATE TABLE IF NOT EXISTS events (room TEXT PRIMARY KEY, n INTEGER NOT NULL)")
+
+    def _conn(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextlib.contextmanager
+    def _tx(self):
+        db = self._conn()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        else:
+            db.execute("COMMIT")
+
+    def claim(self, room, name, token, threshold, now):
+        with self._tx() as db:
+            row = db.execute("SELECT token, last_seen FROM presence WHERE room = ? AND name = ?",
+                             (room, name)).fetchone()
+            if row and row[0] and row[0] != token and (now - row[1]) < threshold:
+                return False
+            self._upsert(db, room, name, token, now)
+            return True
+
+    @staticmethod
+    def _upsert(db, room, name, token, now):
+        db.execute("INSERT INTO presence (room, name, token, last_seen) VALUES (?, ?, ?, ?) "
+                   "ON CONFLICT(room, name) DO UPDATE SET token = excluded.token, last_seen = excluded.last_seen",
+                   (room, name, token, now))
+
+    def snapshot(self, room):
+        rows = self._conn().execute("SELECT name, last_seen FROM presence WHERE room = ?", (room,))
+        return dict(rows.fetchall())
+
+    def clear(self, room):
+        with self._tx() as db:
+            db.execute("DELETE FROM presence WHERE room = ?", (room,))
+
+    def version(self, room):
+        row = self._conn().execute("SELECT n FROM events WHERE room = ?", (room,)).fetchone()
+        return row[0] if row else 0
+
+    def publish(self, room):
+        with self._tx() as db:
+            db.execute("INSERT INTO events (room, n) VALUES (?, 1) ON CONFLICT(room) DO UPDATE SET n = n + 1",
+                       (room,))
+            return db.execute("SELECT n FROM events WHERE room = ?", (room,)).fetchone()[0]
+
+    def wait(self, room, seen, timeout):
+        # otro proceso no puede despertarnos: se consulta el contador cada WAIT_POLL
+        deadline = time.monotonic() + timeout
+        while True:
+            current = self.version(room)
+            remaining = deadline - time.monotonic()
+            if current != seen or remaining <= 0:
+                return current
+            time.sleep(min(WAIT_POLL, remaining))
+
+
+# ---------------------------
+# En memoria (un proceso; sustituto para pruebas)
+# ---------------------------
+class MemoryCoordinator(_Coordinator):
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._presence = {}   # (sala, nombre) -> [token, last_seen]
+        self._events = {}     # sala -> contador
+
+    def claim(self, room, name, token, threshold, now):
+        with self._cond:
+            current = self._presence.get((room, name))
+            if current and current[0] and current[0] != token and (now - current[1]) < threshold:
+                return False
+            self._presence[(room, name)] = [token, now]
+            return True
+
+    def snapshot(self, room):
+        with self._cond:
+            return {name: entry[1] for (r, name), entry in self._presence.items() if r == room}
+
+    def clear(self, room):
+        with self._cond:
+            for key in [k for k in self._presence if k[0] == room]:
+                del self._presence[key]
+
+    def version(self, room):
+        with self._cond:
+            return self._events.get(room, 0)
+
+    def publish(self, room):
+        with self._cond:
+            self._events[room] = self._events.get(room, 0) + 1
+            self._cond.notify_all()
+            return self._events[room]
+
+    def wait(self, room, seen, timeout):
+        with self._cond:
+            self._cond.wait_for(lambda: self._events.get(room, 0) != seen, timeout)
+            return self._events.get(room, 0)
+
+
+_coordinators = {}
+_coordinators_lock = threading.Lock()
+
+
+def get_coordinator(spec):
+    """Coordinador único por configuración dentro del proceso (None = sin coordinación)."""
+    if not spec:
+        return None
+    with _coordinators_lock:
+        coordinator = _coordinators.get(spec)
+        if coordinator is None:
+            coordinator = MemoryCoordinator() if spec == "memoria" else SqliteCoordinator(spec)
+            _coordinators[spec] = coordinator
+        return coordinator
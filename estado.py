@@ -0,0 +1,545 @@
+# estado.py — Almacén del estado de la carrera (state.json, SQLite WAL o diferido)
+#
+# Todas las modificaciones pasan por transacciones: se toma el candado, se lee
+# el estado más reciente, se aplica la función y se escribe de forma atómica.
+# Así dos sesiones que envían a la vez se serializan en lugar de pisarse los
+# puntos (el antiguo ciclo load -> mutar -> save no tenía candado).
+#
+# Las lecturas se sirven desde una caché del proceso: el estado parseado se
+# guarda junto a un número de versión creciente y sólo se vuelve a parsear
+# cuando el archivo cambió (mtime/tamaño/inodo) o cuando otro proceso hizo
+# commit (contador de revisión en SQLite). El dict devuelto por load() es
+# compartido entre sesiones: es de sólo lectura, los cambios van por
+# transaction()/update().
+#
+# Cada jugador es un PlayerRecord (jugadores.py); en disco se guarda en el
+# formato compacto de filas, sin sangría y sin la lista "jugadores" duplicada
+# (el formato anterior se migra al leerlo).
+#
+# Además cada almacén anota en un registro corto qué jugador tocó cada versión
+# (None = cambio general o hecho por otro proceso). changed_between() permite a
+# índices derivados, como la clasificación, actualizar sólo esos jugadores.
+import atexit
+import collections
+import contextlib
+import copy
+import json
+import os
+import sqlite3
+import threading
+
+import metricas
+from eventos import ChangeNotifier
+from jugadores import PlayerRecord, decode_record, decode_state, encode_state, is_current
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+CHANGELOG_SIZE = 1024  # versiones recientes cuyo jugador modificado se recuerda
+WRITE_BEHIND_INTERVAL = 0.25  # s entre volcados del backend diferido
+JOURNAL_MAX_ENTRIES = 512     # registros en el diario antes de compactar en una instantánea
+
+
+def _changed_between(changelog, since, until):
+    # jugadores tocados en las versiones (since, until]; None si algún paso es desconocido
+    if since is None:
+        return None
+    if since == until:
+        return set()
+    touched = {version: player for version, player in changelog if since < version <= until}
+    names = set()
+    for version in range(since + 1, until + 1):
+        player = touched.get(version)
+        if player is None:
+            return None
+        names.add(player)
+    return names
+
+
+def default_state():
+    # players_info: {nombre: PlayerRecord}, en orden de llegada
+    return {"inicio": None, "players_info": {}, "organizer": None}
+
+
+class _MissingPlayer(Exception):
+    """update(..., create=False) sobre un jugador que no existe: se deshace sin escribir."""
+
+
+def _dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+@contextlib.contextmanager
+def _file_lock(lock_path):
+    """Candado exclusivo entre procesos sobre un archivo auxiliar (.lock)."""
+    with open(lock_path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+# ---------------------------
+# Backend JSON (escritura atómica tmp + rename, con candado de archivo)
+# ---------------------------
+class JsonStateStore:
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self._lock = threading.RLock()
+        self.version = 0
+        self._cache = None
+        self._cache_sig = None
+        self.changes = ChangeNotifier()
+        self._changelog = collections.deque(maxlen=CHANGELOG_SIZE)
+
+    def _signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _remember(self, data, sig, touched=None):
+        self._cache = data
+        self._cache_sig = sig
+        self.version += 1
+        self._changelog.append((self.version, touched))
+        self.changes.publish()
+
+    def changed_between(self, since, until):
+        with self._lock:
+            return _changed_between(self._changelog, since, until)
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8-sig") as f:
+                data = decode_state(json.load(f))
+                metricas.add_bytes("state", "read", f.tell())
+        except FileNotFoundError:
+            return default_state()
+        for key, value in default_state().items():
+            data.setdefault(key, value)
+        return data
+
+    def _write(self, data, touched=None):
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(_dumps(encode_state(data)))
+            metricas.add_bytes("state", "write", f.tell())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._remember(data, self._signature(), touched)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with self._lock, _file_lock(self.lock_path):
+            yield
+
+    def load(self):
+        return self.load_versioned()[1]
+
+    def load_versioned(self):
+        """(versión, estado); sólo parsea si el archivo cambió desde la última lectura."""
+        sig = self._signature()
+        with self._lock:
+            if self._cache is None or sig != self._cache_sig:
+                self._remember(self._read(), sig)
+            return self.version, self._cache
+
+    def save(self, data):
+        with self._locked():
+            self._write(data)
+
+    def transaction(self, fn, touched=None):
+        """Aplica fn(state) sobre el estado más reciente y lo persiste; devuelve lo que retorne fn."""
+        with self._locked():
+            if self._signature() != self._cache_sig:
+                touched = None  # otro proceso escribió desde nuestra última lectura
+            data = self._read()
+            result = fn(data)
+            self._write(data, touched)
+            return result
+
+    def update(self, player, fn, create=True):
+        """Aplica fn(pinfo, state) al registro de un jugador; devuelve una copia del registro.
+
+        Con create=False no se crea un jugador que no existe (p. ej. borrado por un RESET):
+        no se escribe nada y se devuelve None.
+        """
+        def apply(data):
+            pinfo = data.setdefault("players_info", {}).get(player)
+            if pinfo is None:
+                if not create:
+                    raise _MissingPlayer
+                pinfo = data["players_info"][player] = PlayerRecord()
+            fn(pinfo, data)
+            return pinfo.copy()
+        try:
+            return self.transaction(apply, touched=player)
+        except _MissingPlayer:
+            return None
+
+
+# ---------------------------
+# Backend SQLite (WAL, un registro por jugador)
+# ---------------------------
+class SqliteStateStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._cache_lock = threading.Lock()
+        self._cache = None
+        self.version = 0
+        self.changes = ChangeNotifier()
+        self._changelog = collections.deque(maxlen=CHANGELOG_SIZE)
+        with self._tx() as db:
+            db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            db.execute("CREATE TABLE IF NOT EXISTS players (name TEXT PRIMARY KEY, data TEXT NOT NULL)")
+            # contador de revisión: cada transacción de escritura lo incrementa
+            db.execute("CREATE TABLE IF NOT EXISTS rev (id INTEGER PRIMARY KEY CHECK (id = 0), n INTEGER NOT NULL)")
+            db.execute("INSERT OR IGNORE INTO rev (id, n) VALUES (0, 0)")
+            # formato 1: filas con el dict completo del jugador -> fila compacta
+            old = db.execute("SELECT name, data FROM players WHERE data LIKE '{%'").fetchall()
+            db.executemany("UPDATE players SET data = ? WHERE name = ?",
+                           [(_dumps(decode_record(json.loads(raw)).to_row()), name) for name, raw in old])
+
+    def _conn(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextlib.contextmanager
+    def _tx(self, write=True, touched=None):
+        db = self._conn()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+            if write:
+                db.execute("UPDATE rev SET n = n + 1 WHERE id = 0")
+                rev = db.execute("SELECT n FROM rev WHERE id = 0").fetchone()[0]
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        else:
+            db.execute("COMMIT")
+            if write:
+                with self._cache_lock:
+                    self._changelog.append((rev, touched))
+                self.changes.publish()
+
+    def changed_between(self, since, until):
+        with self._cache_lock:
+            return _changed_between(self._changelog, since, until)
+
+    @staticmethod
+    def _read_meta(db):
+        data = default_state()
+        for key, value in db.execute("SELECT key, value FROM meta"):
+            data[key] = json.loads(value)
+        return data
+
+    def _read(self, db):
+        data = self._read_meta(db)
+        n = 0
+        for name, raw in db.execute("SELECT name, data FROM players ORDER BY rowid"):
+            data["players_info"][name] = decode_record(json.loads(raw))
+            n += len(raw)
+        metricas.add_bytes("state", "read", n)
+        return data
+
+    @staticmethod
+    def _write(db, data):
+        db.execute("DELETE FROM meta")
+        db.executemany(
+            "INSERT INTO meta (key, value) VALUES (?, ?)",
+            [(k, _dumps(v)) for k, v in data.items() if k != "players_info"],
+        )
+        rows = [(name, _dumps(rec.to_row())) for name, rec in data.get("players_info", {}).items()]
+        db.execute("DELETE FROM players")
+        db.executemany("INSERT INTO players (name, data) VALUES (?, ?)", rows)
+        metricas.add_bytes("state", "write", sum(len(r[1]) for r in rows))
+
+    def load(self):
+        return self.load_versioned()[1]
+
+    def load_versioned(self):
+        """(revisión, estado); sólo relee las tablas si alguien hizo commit desde la última lectura."""
+        db = self._conn()
+        with self._cache_lock:
+            rev = db.execute("SELECT n FROM rev WHERE id = 0").fetchone()[0]
+            if self._cache is None or rev != self.version:
+                db.execute("BEGIN")
+                try:
+                    rev = db.execute("SELECT n FROM rev WHERE id = 0").fetchone()[0]
+                    self._cache = self._read(db)
+                finally:
+                    db.execute("COMMIT")
+                if rev != self.version:
+                    self.changes.publish()
+                self.version = rev
+            return self.version, self._cache
+
+    def save(self, data):
+        with self._tx() as db:
+            self._write(db, data)
+
+    def transaction(self, fn):
+        with self._tx() as db:
+            data = self._read(db)
+            result = fn(data)
+            self._write(db, data)
+            return result
+
+    def update(self, player, fn, create=True):
+        # sólo se lee y reescribe la fila del jugador (más los metadatos de sólo lectura)
+        try:
+            with self._tx(touched=player) as db:
+                data = self._read_meta(db)
+                row = db.execute("SELECT data FROM players WHERE name = ?", (player,)).fetchone()
+                if row is None and not create:
+                    raise _MissingPlayer  # ROLLBACK: ni fila nueva ni revisión
+                pinfo = decode_record(json.loads(row[0])) if row else PlayerRecord()
+                fn(pinfo, data)
+                raw = _dumps(pinfo.to_row())
+                db.execute(
+                    "INSERT INTO players (name, data) VALUES (?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET data = excluded.data",
+                    (player, raw),
+                )
+                metricas.add_bytes("state", "read", len(row[0]) if row else 0)
+                metricas.add_bytes("state", "write", len(raw))
+                return pinfo.copy()
+        except _MissingPlayer:
+            return None
+
+
+# ---------------------------
+# Backend diferido (write-behind: memoria + instantánea compacta + diario)
+# ---------------------------
+# El estado vive en memoria del proceso y las transacciones no tocan disco: un
+# hilo lo vuelca cada WRITE_BEHIND_INTERVAL segundos, o enseguida ante eventos
+# clave de la carrera (inicio, RESET, un jugador que termina). Cada volcado
+# agrega al diario (state.json.journal) los registros de jugador modificados;
+# si hubo un cambio general o el diario superó JOURNAL_MAX_ENTRIES se escribe
+# en su lugar una instantánea compacta de todo el estado (tmp + rename) y el
+# diario se vacía. Al arrancar se carga la instantánea y se reaplica el diario,
+# así que una caída pierde como mucho un intervalo de volcado. Como el estado
+# autoritativo está en memoria, sirve para un único proceso servidor.
+_VERSION_KEY = "_version"  # versión del estado incluida en la instantánea
+
+
+class WriteBehindStateStore:
+    def __init__(self, path, flush_interval=WRITE_BEHIND_INTERVAL):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.flush_interval = flush_interval
+        self._lock = threading.RLock()
+        self._io_lock = threading.Lock()   # un volcado a la vez
+        self._wake = threading.Event()
+        self.changes = ChangeNotifier()
+        self._changelog = collections.deque(maxlen=CHANGELOG_SIZE)
+        self._dirty = set()                # jugadores modificados desde el último volcado
+        self._snapshot_due = False
+        self._journal_entries = 0
+        self.last_error = None             # último fallo de volcado (se reintenta solo)
+        self.version, self._data = self._recover()
+        self._thread = threading.Thread(target=self._run, name="estado-diferido", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ---------------------------
+    # Recuperación y volcado
+    # ---------------------------
+    def _recover(self):
+        try:
+            with open(self.path, "r", encoding="utf-8-sig") as f:
+                raw = json.load(f)
+                metricas.add_bytes("state", "read", f.tell())
+        except FileNotFoundError:
+            raw = {"formato": None}
+        data = decode_state(raw)
+        for key, value in default_state().items():
+            data.setdefault(key, value)
+        version = base = data.pop(_VERSION_KEY, 0)
+        try:
+            # errors="replace": una línea cortada a mitad de un carácter no impide leer el resto
+            with open(self.journal_path, "r", encoding="utf-8", errors="replace") as f:
+                journal = f.read()
+            metricas.add_bytes("state", "read", len(journal))
+        except FileNotFoundError:
+            journal = ""
+        for line in journal.splitlines():
+            self._journal_entries += 1
+            try:
+                entry = json.loads(line)
+                v, name, row = entry["v"], entry["p"], entry["r"]
+            except (ValueError, KeyError, TypeError):
+                # línea a medio escribir (caída, o un volcado fallido que se reintentó
+                # después): se saltea, los registros siguientes siguen siendo válidos
+                continue
+            if v <= base:
+                continue  # ya incluido en la instantánea
+            data["players_info"][name] = decode_record(row)
+            version = max(version, v)
+        # el primer volcado compacta lo recuperado, descarta una cola rota y migra el formato 1
+        self._snapshot_due = self._journal_entries > 0 or (os.path.exists(self.path) and not is_current(raw))
+        return version, data
+
+    def _write_snapshot(self, body):
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        with open(self.journal_path, "w", encoding="utf-8"):
+            pass
+        metricas.add_bytes("state", "write", len(body))
+
+    def _append_journal(self, body):
+        data = body.encode("utf-8")
+        with open(self.journal_path, "ab+") as f:
+            # si un volcado anterior quedó a medio escribir (p. ej. disco lleno), se cierra
+            # esa línea para que el primer registro de este no quede pegado a ella
+            if f.seek(0, os.SEEK_END):
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    data = b"\n" + data
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        metricas.add_bytes("state", "write", len(data))
+
+    def flush(self):
+        """Vuelca ya lo pendiente (lanza OSError si falla; lo pendiente se conserva)."""
+        with self._io_lock:
+            with self._lock:
+                if not self._dirty and not self._snapshot_due:
+                    return
+                dirty, self._dirty = self._dirty, set()
+                snapshot = self._snapshot_due or self._journal_entries + len(dirty) > JOURNAL_MAX_ENTRIES
+                self._snapshot_due = False
+                if snapshot:
+                    body = _dumps({**encode_state(self._data), _VERSION_KEY: self.version})
+                else:
+                    players = self._data["players_info"]
+                    body = "".join(_dumps({"v": self.version, "p": name, "r": players[name].to_row()}) + "\n"
+                                   for name in dirty if name in players)
+            try:
+                if snapshot:
+                    self._write_snapshot(body)
+                    self._journal_entries = 0
+                else:
+                    self._append_journal(body)
+                    self._journal_entries += len(dirty)
+            except OSError as e:
+                with self._lock:
+                    self._dirty |= dirty
+                    self._snapshot_due = self._snapshot_due or snapshot
+                self.last_error = e
+                raise
+            self.last_error = None
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                with metricas.timed("state_flush"):
+                    self.flush()
+            except OSError:
+                pass  # queda en last_error y se reintenta en el próximo ciclo
+
+    def close(self):
+        try:
+            self.flush()
+        except OSError:
+            pass
+
+    # ---------------------------
+    # API del almacén
+    # ---------------------------
+    def _commit(self, data, touched=None):
+        # llamar con self._lock tomado; los dicts publicados no se vuelven a mutar
+        self._data = data
+        self.version += 1
+        self._changelog.append((self.version, touched))
+        if touched is None:
+            self._snapshot_due = True
+            self._wake.set()  # cambio general (inicio, RESET): volcar sin esperar el intervalo
+        self.changes.publish()
+
+    def changed_between(self, since, until):
+        with self._lock:
+            return _changed_between(self._changelog, since, until)
+
+    def load(self):
+        return self.load_versioned()[1]
+
+    def load_versioned(self):
+        with self._lock:
+            return self.version, self._data
+
+    def save(self, data):
+        with self._lock:
+            self._commit(copy.deepcopy(data))
+
+    def transaction(self, fn):
+        with self._lock:
+            data = copy.deepcopy(self._data)
+            result = fn(data)
+            self._commit(data)
+            return result
+
+    def update(self, player, fn, create=True):
+        # copia superficial: sólo se reemplazan el dict de jugadores y el registro tocado
+        with self._lock:
+            before = self._data.get("players_info", {}).get(player)
+            if before is None and not create:
+                return None
+            data = dict(self._data)
+            players = data["players_info"] = dict(data.get("players_info", {}))
+            pinfo = before.copy() if before is not None else PlayerRecord()
+            fn(pinfo, data)
+            players[player] = pinfo
+            self._dirty.add(player)
+            self._commit(data, touched=player)
+            if pinfo.get("fin") and not (before is not None and before.get("fin")):
+                self._wake.set()  # un jugador terminó: su tiempo final se vuelca ya
+            return pinfo.copy()
+
+
+# ---------------------------
+# Selección de backend
+# ---------------------------
+BACKENDS = {"json": JsonStateStore, "sqlite": SqliteStateStore, "diferido": WriteBehindStateStore}
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path, backend="json"):
+    """Almacén único por (ruta, backend) dentro del proceso."""
+    with _stores_lock:
+        store = _stores.get((path, backend))
+        if store is None:
+            store = _stores[(path, backend)] = BACKENDS[backend](path)
+        return store
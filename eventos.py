@@ -0,0 +1,46 @@
+# eventos.py — Avisos de cambio del estado entre sesiones del mismo proceso
+#
+# En lugar de que cada cliente re-ejecute el script dos veces por segundo para
+# "ver si pasó algo", una sesión puede dormir sobre una threading.Condition
+# hasta que el estado cambie de versión (o hasta que se cumpla una condición,
+# p. ej. que el organizador inicie la carrera). Los almacenes de estado.py
+# publican en su notificador cada vez que escriben o detectan un cambio hecho
+# por otro proceso; para estos últimos la espera revisa el almacén cada `poll`.
+import threading
+import time
+
+
+class ChangeNotifier:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self.version = 0
+
+    def publish(self):
+        with self._cond:
+            self.version += 1
+            self._cond.notify_all()
+
+    def wait(self, seen, timeout):
+        """Duerme hasta que la versión sea distinta de `seen` o pase `timeout`; devuelve la versión actual."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.version != seen, timeout)
+            return self.version
+
+
+def wait_until(store, predicate, timeout, poll=0.5, changes=None):
+    """Espera a que predicate(estado) sea verdadero; False si se agotó el tiempo.
+
+    `changes` reemplaza al notificador del almacén (p. ej. el de una sala
+    coordinada entre varios procesos).
+    """
+    changes = store.changes if changes is None else changes
+    deadline = time.monotonic() + timeout
+    seen = changes.version
+    _, data = store.load_versioned()
+    while not predicate(data):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        seen = changes.wait(seen, min(poll, remaining))
+        _, data = store.load_versioned()
+    return True
@@ -0,0 +1,147 @@
+# jugadores.py — Registro compacto de cada jugador y su formato en disco
+#
+# En memoria cada jugador es un PlayerRecord con __slots__ (campos fijos, sin
+# dict por instancia). Se sigue pudiendo usar como un dict (p.get("points"),
+# p["preg"] = ...) para que las transacciones de estado.py, reloj.py y
+# carrera.py no cambien, pero asignar un campo desconocido es un error.
+#
+# En disco (formato 2) cada jugador es una fila posicional [nombre, points,
+# aciertos, ...] sin los valores por defecto finales, y ya no se guarda la lista
+# "jugadores" (el orden de las filas es el orden de llegada). Los campos nuevos
+# sólo pueden agregarse al FINAL de FIELDS para que las filas viejas sigan
+# leyéndose. El formato 1 (players_info con dicts + lista jugadores, con
+# last_seen/session_token heredados) se migra al leerlo y se reescribe en el
+# formato nuevo con la siguiente escritura.
+FORMAT_VERSION = 2
+
+FIELDS = ("points", "aciertos", "preg", "fin", "tiempo", "joined",
+          "ultima", "limite", "limite_preg", "feedback_hasta")
+DEFAULTS = (0, 0, 0, False, None, None, None, None, None, None)
+_DEFAULTS = dict(zip(FIELDS, DEFAULTS))
+
+
+class PlayerRecord:
+    __slots__ = FIELDS
+
+    # parámetros en el mismo orden y con los mismos valores que FIELDS/DEFAULTS: asignar
+    # cada campo explícitamente es varias veces más rápido que un bucle con setattr
+    def __init__(self, points=0, aciertos=0, preg=0, fin=False, tiempo=None, joined=None,
+                 ultima=None, limite=None, limite_preg=None, feedback_hasta=None):
+        self.points = points
+        self.aciertos = aciertos
+        self.preg = preg
+        self.fin = fin
+        self.tiempo = tiempo
+        self.joined = joined
+        self.ultima = ultima
+        self.limite = limite
+        self.limite_preg = limite_preg
+        self.feedback_hasta = feedback_hasta
+
+    # ---------------------------
+    # Acceso estilo dict
+    # ---------------------------
+    def __getitem__(self, key):
+        if key not in _DEFAULTS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        if key not in _DEFAULTS:
+            raise KeyError(f"campo desconocido en el registro de jugador: {key}")
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in _DEFAULTS
+
+    def __iter__(self):
+        return iter(FIELDS)
+
+    def get(self, key, default=None):
+        if key not in _DEFAULTS:
+            return default
+        value = getattr(self, key)
+        return default if value is None else value
+
+    def setdefault(self, key, default=None):
+        if self.get(key) is None:
+            self[key] = default
+        return self[key]
+
+    def update(self, values=(), **kwargs):
+        for key, value in (values.items() if hasattr(values, "items") else values):
+            self[key] = value
+        for key, value in kwargs.items():
+            self[key] = value
+
+    def items(self):
+        return [(name, getattr(self, name)) for name in FIELDS]
+
+    def copy(self):
+        return PlayerRecord(*self.to_row())
+
+    __copy__ = copy
+
+    def __deepcopy__(self, memo):
+        return self.copy()  # todos los campos son inmutables
+
+    def __eq__(self, other):
+        return isinstance(other, PlayerRecord) and self.items() == other.items()
+
+    def __repr__(self):
+        return f"PlayerRecord({', '.join(f'{k}={v!r}' for k, v in self.items() if v != _DEFAULTS[k])})"
+
+    # ---------------------------
+    # Codificación
+    # ---------------------------
+    def to_row(self):
+        row = [self.points, self.aciertos, self.preg, self.fin, self.tiempo, self.joined,
+               self.ultima, self.limite, self.limite_preg, self.feedback_hasta]
+        while row and row[-1] == DEFAULTS[len(row) - 1] and type(row[-1]) is type(DEFAULTS[len(row) - 1]):
+            row.pop()
+        return row
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row[:len(FIELDS)])
+
+    @classmethod
+    def from_dict(cls, data):
+        # formato 1: se ignoran los campos que ya no existen (last_seen, session_token, ...)
+        return cls(**{k: v for k, v in data.items() if k in _DEFAULTS})
+
+
+def decode_record(value):
+    """Registro desde una fila (formato 2) o un dict (formato 1)."""
+    if isinstance(value, dict):
+        return PlayerRecord.from_dict(value)
+    return PlayerRecord.from_row(value)
+
+
+def encode_state(data):
+    """Estado en memoria -> objeto JSON en formato 2."""
+    out = {k: v for k, v in data.items() if k not in ("players_info", "jugadores")}
+    out["formato"] = FORMAT_VERSION
+    out["players"] = [[name] + rec.to_row() for name, rec in data.get("players_info", {}).items()]
+    return out
+
+
+def decode_state(raw):
+    """Objeto JSON (formato 1 o 2) -> estado en memoria con PlayerRecord."""
+    data = {k: v for k, v in raw.items() if k not in ("formato", "players", "players_info", "jugadores")}
+    players = {}
+    if raw.get("formato") == FORMAT_VERSION:
+        for row in raw.get("players", []):
+            players[row[0]] = PlayerRecord.from_row(row[1:])
+    else:
+        info = raw.get("players_info", {})
+        # el orden de llegada lo daba la lista "jugadores"; los que sólo están allí quedan en blanco
+        for name in list(raw.get("jugadores", [])) + list(info):
+            if name not in players:
+                players[name] = PlayerRecord.from_dict(info.get(name, {}))
+    data["players_info"] = players
+    return data
+
+
+def is_current(raw):
+    return raw.get("formato") == FORMAT_VERSION
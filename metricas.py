@@ -0,0 +1,187 @@
+# metricas.py — Instrumentación del camino caliente (latencias, E/S, reruns)
+#
+# Registro único por proceso, barato y sin dependencias: cada llamada de
+# persistencia y cada fase de render importante se mide con `timed(nombre)` y
+# se acumula en un histograma de cubetas fijas (como Prometheus). Los módulos de
+# persistencia suman además los bytes que leen y escriben. El panel
+# "Rendimiento" del admin lee `snapshot()`, y `export()` vuelca todo a un
+# archivo local en JSON o en formato de texto de Prometheus (.prom).
+import contextlib
+import json
+import os
+import threading
+import time
+
+# límites superiores de las cubetas, en segundos
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, float("inf"))
+SESSION_IDLE_SECONDS = 600   # una sesión sin reruns en este lapso deja de contarse por separado
+PRUNE_EVERY_SECONDS = 60     # frecuencia con la que se descartan las sesiones inactivas
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        for i, limit in enumerate(BUCKETS):
+            if seconds <= limit:
+                self.counts[i] += 1
+                break
+        self.total += seconds
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimación por cubetas: límite superior de la cubeta que contiene el cuantil."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for limit, n in zip(BUCKETS, self.counts):
+            seen += n
+            if seen >= target:
+                return limit if limit != float("inf") else BUCKETS[-2]
+        return BUCKETS[-2]
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}   # nombre -> Histogram
+        self.io = {}           # (recurso, "read"|"write") -> bytes
+        self.reruns = {}       # id de sesión activa -> [cantidad de reruns, último rerun (monotonic)]
+        self.total_reruns = 0  # incluye los de sesiones ya descartadas
+        self.started = time.time()
+        self._pruned = time.monotonic()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            hist = self.histograms.get(name)
+            if hist is None:
+                hist = self.histograms[name] = Histogram()
+            hist.observe(seconds)
+
+    def add_bytes(self, resource, direction, n):
+        with self._lock:
+            key = (resource, direction)
+            self.io[key] = self.io.get(key, 0) + n
+
+    def rerun(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self.reruns.get(session_id)
+            if entry is None:
+                entry = self.reruns[session_id] = [0, now]
+            entry[0] += 1
+            entry[1] = now
+            self.total_reruns += 1
+            # Streamlit no avisa cuando una sesión se cierra: se descartan las inactivas
+            if now - self._pruned >= PRUNE_EVERY_SECONDS:
+                self._pruned = now
+                for sid in [sid for sid, (_, last) in self.reruns.items() if now - last > SESSION_IDLE_SECONDS]:
+                    del self.reruns[sid]
+
+    @contextlib.contextmanager
+    def timed(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.io.clear()
+            self.reruns.clear()
+            self.total_reruns = 0
+            self.started = time.time()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "desde": self.started,
+                "latencias": {
+                    name: {
+                        "count": h.count,
+                        "sum_s": h.total,
+                        "mean_ms": (h.total / h.count * 1000) if h.count else 0.0,
+                        "p50_ms": h.quantile(0.5) * 1000,
+                        "p99_ms": h.quantile(0.99) * 1000,
+                        "buckets": list(h.counts),
+                    }
+                    for name, h in sorted(self.histograms.items())
+                },
+                "io_bytes": {f"{res}.{d}": n for (res, d), n in sorted(self.io.items())},
+                "reruns": {
+                    "sesiones": len(self.reruns),
+                    "total": self.total_reruns,
+                    "por_sesion": {sid: n for sid, (n, _) in self.reruns.items()},
+                },
+            }
+
+    def to_prometheus(self):
+        snap = self.snapshot()
+        lines = [
+            "# HELP carrera_latency_seconds Latencia de persistencia y render",
+            "# TYPE carrera_latency_seconds histogram",
+        ]
+        for name, h in snap["latencias"].items():
+            acc = 0
+            for limit, n in zip(BUCKETS, h["buckets"]):
+                acc += n
+                le = "+Inf" if limit == float("inf") else repr(limit)
+                lines.append(f'carrera_latency_seconds_bucket{{op="{name}",le="{le}"}} {acc}')
+            lines.append(f'carrera_latency_seconds_sum{{op="{name}"}} {h["sum_s"]}')
+            lines.append(f'carrera_latency_seconds_count{{op="{name}"}} {h["count"]}')
+        lines += ["# HELP carrera_io_bytes_total Bytes leídos/escritos por recurso",
+                  "# TYPE carrera_io_bytes_total counter"]
+        for key, n in snap["io_bytes"].items():
+            res, direction = key.rsplit(".", 1)
+            lines.append(f'carrera_io_bytes_total{{resource="{res}",direction="{direction}"}} {n}')
+        lines += ["# HELP carrera_reruns_total Reruns del script",
+                  "# TYPE carrera_reruns_total counter",
+                  f"carrera_reruns_total {snap['reruns']['total']}",
+                  f"# HELP carrera_sessions Sesiones con algún rerun en los últimos {SESSION_IDLE_SECONDS} s",
+                  "# TYPE carrera_sessions gauge",
+                  f"carrera_sessions {snap['reruns']['sesiones']}"]
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """Escribe las métricas en `path` (.prom -> texto Prometheus, si no JSON)."""
+        if path.endswith(".prom"):
+            body = self.to_prometheus()
+        else:
+            body = json.dumps(self.snapshot(), ensure_ascii=False)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(body)
+        os.replace(tmp, path)
+
+
+METRICS = Metrics()
+timed = METRICS.timed
+observe = METRICS.observe
+add_bytes = METRICS.add_bytes
+
+_last_export = 0.0
+_export_lock = threading.Lock()
+
+
+def maybe_export(path, interval=5.0):
+    """Exporta a `path` como mucho cada `interval` segundos (llamar al final de cada rerun)."""
+    global _last_export
+    if not path:
+        return
+    now = time.monotonic()
+    with _export_lock:
+        if now - _last_export < interval:
+            return
+        _last_export = now
+    try:
+        METRICS.export(path)
+    except OSError:
+        pass
@@ -0,0 +1,125 @@
+# presencia.py — Heartbeats de los jugadores fuera de state.json
+#
+# El latido de cada sesión (last_seen + session_token) vive en memoria del
+# proceso. Cada FLUSH_INTERVAL segundos, y sólo si hubo cambios, se vuelca a un
+# archivo lateral pequeño (presence.json) que además permite que otros procesos
+# vean a los jugadores activos y que un reinicio no olvide quién estaba jugando.
+# state.json sólo se toca cuando cambian puntajes o el estado de la carrera.
+import json
+import os
+import threading
+import time
+
+import metricas
+
+FLUSH_INTERVAL = 2.0   # segundos entre volcados al archivo lateral (< ACTIVE_THRESHOLD)
+
+
+class Presence:
+    def __init__(self, path=None, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._seen = {}          # nombre -> [session_token, last_seen]
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        self._file_sig = None    # (mtime_ns, size) del archivo la última vez que se leyó
+        self._merge_from_disk()
+
+    # ---------------------------
+    # Archivo lateral
+    # ---------------------------
+    def _merge_from_disk(self):
+        # incorpora latidos escritos por otros procesos (gana el más reciente)
+        if not self.path:
+            return
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        sig = (st.st_mtime_ns, st.st_size)
+        if sig == self._file_sig:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                disk = json.load(f)
+                metricas.add_bytes("presence", "read", f.tell())
+        except (OSError, ValueError):
+            return
+        self._file_sig = sig
+        for name, (token, last_seen) in disk.items():
+            mine = self._seen.get(name)
+            if mine is None or last_seen > mine[1]:
+                self._seen[name] = [token, last_seen]
+
+    def _flush(self, force=False):
+        now = time.monotonic()
+        if not self.path or not (self._dirty or force):
+            return
+        if not force and now - self._last_flush < self.flush_interval:
+            return
+        self._merge_from_disk()
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._seen, f, ensure_ascii=False, separators=(",", ":"))
+            metricas.add_bytes("presence", "write", f.tell())
+        os.replace(tmp, self.path)
+        st = os.stat(self.path)
+        self._file_sig = (st.st_mtime_ns, st.st_size)
+        self._dirty = False
+        self._last_flush = now
+
+    def flush(self):
+        with self._lock:
+            self._flush(force=True)
+
+    # ---------------------------
+    # API
+    # ---------------------------
+    def claim(self, name, token, threshold, now=None):
+        """Latido con bloqueo multi-pestaña.
+
+        Si otra sesión (otro token) del mismo nombre dio señales hace menos de
+        `threshold` segundos, devuelve False y no toca nada. Si no, registra el
+        token de esta sesión como dueño del nombre y devuelve True.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._merge_from_disk()
+            current = self._seen.get(name)
+            if current and current[0] and current[0] != token and (now - current[1]) < threshold:
+                return False
+            self._seen[name] = [token, now]
+            self._dirty = True
+            self._flush()
+            return True
+
+    def snapshot(self):
+        """Copia {nombre: last_seen} incluyendo lo que hayan volcado otros procesos."""
+        with self._lock:
+            self._merge_from_disk()
+            return {name: entry[1] for name, entry in self._seen.items()}
+
+    def clear(self):
+        with self._lock:
+            self._seen.clear()
+            self._dirty = False
+            if self.path:
+                try:
+                    os.remove(self.path)
+                except FileNotFoundError:
+                    pass
+            self._file_sig = None
+
+
+_presences = {}
+_presences_lock = threading.Lock()
+
+
+def get_presence(path=None):
+    """Registro de presencia único por ruta dentro del proceso."""
+    with _presences_lock:
+        presence = _presences.get(path)
+        if presence is None:
+            presence = _presences[path] = Presence(path)
+        return presence
@@ -0,0 +1,102 @@
+# ranking.py — Clasificación en vivo mantenida incrementalmente
+#
+# Lista ordenada de (clave, nombre) con bisect. La clave ordena por puntos
+# (desc), luego tiempo total de quienes terminaron, luego la hora de la última
+# respuesta (antes es mejor). Cuando cambia la versión del estado sólo se
+# reubican los jugadores que el almacén reporta como modificados: la posición
+# se busca en O(log n), pero sacar e insertar en una lista de Python desplaza
+# los elementos siguientes, O(n) por jugador (un memmove de punteros, barato
+# para los tamaños de una carrera: sin recalcular claves ni reordenar).
+#
+# Si el almacén no sabe qué cambió (RESET, changelog desbordado) se reconstruye
+# todo, O(n log n). Con varios workers (coordinacion.py) el changelog de cada
+# proceso sólo registra sus propias escrituras: toda escritura de otro proceso
+# provoca una reconstrucción completa en el siguiente sync().
+import bisect
+import threading
+
+INF = float("inf")
+
+
+def ranking_key(pinfo):
+    tiempo = pinfo.get("tiempo") if pinfo.get("fin") and pinfo.get("tiempo") is not None else INF
+    ultima = pinfo.get("ultima") or INF
+    return (-pinfo.get("points", 0), tiempo, ultima)
+
+
+class Ranking:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = []   # [(clave, nombre)] ordenada
+        self._keys = {}      # nombre -> clave actual
+        self.version = None  # versión del estado que refleja
+
+    def _remove(self, name):
+        key = self._keys.pop(name, None)
+        if key is not None:
+            i = bisect.bisect_left(self._entries, (key, name))
+            if i < len(self._entries) and self._entries[i] == (key, name):
+                del self._entries[i]
+
+    def _place(self, name, pinfo):
+        key = ranking_key(pinfo)
+        if self._keys.get(name) == key:
+            return
+        self._remove(name)
+        self._keys[name] = key
+        bisect.insort(self._entries, (key, name))
+
+    def _rebuild(self, players):
+        self._keys = {name: ranking_key(p) for name, p in players.items()}
+        self._entries = sorted((key, name) for name, key in self._keys.items())
+
+    def sync(self, store):
+        """Pone la clasificación al día con la versión actual del almacén."""
+        version, fs = store.load_versioned()
+        with self._lock:
+            if version == self.version:
+                return
+            players = fs.get("players_info", {})
+            changed = store.changed_between(self.version, version)
+            if changed is None:
+                self._rebuild(players)
+            else:
+                for name in changed:
+                    if name in players:
+                        self._place(name, players[name])
+                    else:
+                        self._remove(name)
+            self.version = version
+
+    def rank(self, name):
+        """Posición 1-based del jugador (None si no está)."""
+        with self._lock:
+            key = self._keys.get(name)
+            if key is None:
+                return None
+            return bisect.bisect_left(self._entries, (key, name)) + 1
+
+    def top(self, k):
+        with self._lock:
+            return [name for _, name in self._entries[:k]]
+
+    def ordering(self):
+        with self._lock:
+            return [name for _, name in self._entries]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_rankings = {}
+_rankings_lock = threading.Lock()
+
+
+def get_ranking(sala):
+    """Clasificación única por sala dentro del proceso, al día con su estado."""
+    with _rankings_lock:
+        ranking = _rankings.get(sala.state_file)
+        if ranking is None:
+            ranking = _rankings[sala.state_file] = Ranking()
+    ranking.sync(sala.store())
+    return ranking
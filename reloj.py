@@ -0,0 +1,93 @@
+# reloj.py — Reloj de la carrera del lado del servidor
+#
+# Los plazos viven en el registro del jugador (estado de la sala), no en la
+# sesión del navegador:
+#   limite / limite_preg  -> hasta cuándo puede contestar la pregunta limite_preg
+#   feedback_hasta        -> cuándo termina el feedback y aparece "Continuar"
+# Un hilo por proceso duerme hasta el próximo plazo y, si el jugador no contestó,
+# registra un envío automático por tiempo agotado. La operación es idempotente
+# (sólo avanza si el jugador sigue en esa pregunta), así que también puede
+# aplicarla la propia sesión al re-ejecutarse, p. ej. tras reiniciar el servidor.
+# Nunca crea al jugador: un vencimiento pendiente de antes de un RESET no lo
+# devuelve a la sala.
+import heapq
+import itertools
+import threading
+import time
+
+
+def expire_question(sala, player, question_idx, total, feedback_seconds, quiz_id=None, now=None):
+    """Aplica el envío por tiempo agotado; True si esta llamada fue la que lo registró."""
+    now = time.time() if now is None else now
+    applied = []
+
+    def timeout(p, fs):
+        if p.get("fin") or p.get("preg", 0) != question_idx:
+            return  # ya contestó (o ya se aplicó el vencimiento)
+        if p.get("limite_preg") != question_idx or not p.get("limite") or p["limite"] > now:
+            return  # no hay plazo vencido para esta pregunta
+        p["preg"] = question_idx + 1
+        p["limite"] = None
+        p["feedback_hasta"] = now + feedback_seconds
+        if p["preg"] >= total:
+            p["fin"] = True
+            p["tiempo"] = int(now - (fs.get("inicio") or now))
+        applied.append(True)
+    if sala.store().update(player, timeout, create=False) is None:
+        return False  # el jugador ya no existe (RESET)
+    if applied:
+        sala.log().append({"timestamp": int(now), "jugador": player, "quiz": quiz_id,
+                           "pregunta_idx": question_idx, "opcion_idx": None, "correct": False,
+                           "timeout": True})
+    return bool(applied)
+
+
+class RaceClock:
+    def __init__(self):
+        self._heap = []
+        self._seq = itertools.count()
+        self._scheduled = set()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def schedule(self, deadline, key, callback):
+        """Ejecuta callback() en `deadline` (epoch). Una sola vez por (`key`, `deadline`).
+
+        El plazo es parte de la clave: tras un RESET la misma pregunta tiene otro plazo
+        y se programa aunque el vencimiento anterior siga en la cola.
+        """
+        with self._cond:
+            key = (key, deadline)
+            if key in self._scheduled:
+                return
+            self._scheduled.add(key)
+            heapq.heappush(self._heap, (deadline, next(self._seq), key, callback))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="reloj-carrera", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.time():
+                    timeout = self._heap[0][0] - time.time() if self._heap else None
+                    self._cond.wait(timeout)
+                _, _, key, callback = heapq.heappop(self._heap)
+                self._scheduled.discard(key)
+            try:
+                callback()
+            except Exception:
+                pass  # el vencimiento se vuelve a aplicar desde la sesión en el próximo rerun
+
+
+_clock = None
+_clock_lock = threading.Lock()
+
+
+def get_clock():
+    global _clock
+    with _clock_lock:
+        if _clock is None:
+            _clock = RaceClock()
+        return _clock
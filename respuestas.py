@@ -0,0 +1,296 @@
+# respuestas.py — Registro de respuestas "solo anexar" (JSON Lines)
+#
+# Cada respuesta es una línea JSON compacta que se agrega al final del archivo
+# con una única escritura O_APPEND: el costo de enviar no depende de cuántas
+# respuestas existan y un corte a mitad de escritura sólo puede dañar la
+# última línea (que el lector descarta). El fsync se agrupa por cantidad o
+# por tiempo para no pagar un flush a disco en cada envío; un temporizador lo
+# fuerza si después de la última respuesta no llega otra que lo dispare.
+#
+# Como el diario sólo crece, la lectura también es incremental: se guarda el
+# desplazamiento ya leído y en cada load() sólo se parsean las líneas nuevas.
+# Junto con los registros se mantienen índices por jugador y por pregunta
+# (posiciones en orden de llegada) para servir páginas filtradas, de la más
+# reciente a la más antigua, sin recorrer ni copiar todo el historial.
+import atexit
+import csv
+import io
+import json
+import os
+import threading
+import time
+
+import metricas
+
+FSYNC_BATCH = 32       # respuestas máximas entre dos fsync
+FSYNC_INTERVAL = 1.0   # segundos máximos entre dos fsync
+
+
+class AnswerLog:
+    """Diario de respuestas en formato JSON Lines (una respuesta por línea)."""
+
+    def __init__(self, path, legacy_path=None):
+        self.path = path
+        self.legacy_path = legacy_path
+        self._lock = threading.Lock()
+        self._fd = None
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self._timer = None   # fsync programado para las respuestas pendientes
+        # caché de lectura (compartida por todas las sesiones del proceso)
+        self._read_lock = threading.Lock()
+        self._cache = []
+        self._offset = 0
+        self._head = b""     # primeros bytes leídos: detectan un RESET hecho por otro proceso
+        self._ino = None
+        self._by_player = {}     # jugador -> [posiciones]
+        self._by_question = {}   # pregunta_idx -> [posiciones]
+        self.version = 0
+
+    # ---------------------------
+    # Escritura
+    # ---------------------------
+    def _open(self):
+        if self._fd is None:
+            self._migrate_legacy()
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            self._repair_tail()
+        return self._fd
+
+    def _repair_tail(self):
+        # si un proceso murió a mitad de línea, cerramos esa línea rota para
+        # que la siguiente respuesta no quede pegada a ella
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() == 0:
+                    return
+                f.seek(-1, os.SEEK_END)
+                last = f.read(1)
+        except OSError:
+            return
+        if last != b"\n":
+            os.write(self._fd, b"\n")
+
+    def _migrate_legacy(self):
+        # answers.json (lista JSON completa) -> answers.jsonl, una sola vez
+        if os.path.exists(self.path) or not self.legacy_path:
+            return
+        try:
+            with open(self.legacy_path, "r", encoding="utf-8-sig") as f:
+                legacy = json.load(f)
+        except Exception:
+            return
+        if not isinstance(legacy, list) or not legacy:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for entry in legacy:
+                f.write(_encode(entry).decode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def append(self, entry):
+        line = _encode(entry)
+        with self._lock:
+            fd = self._open()
+            os.write(fd, line)
+            metricas.add_bytes("answers", "write", len(line))
+            self._pending += 1
+            now = time.monotonic()
+            if self._pending >= FSYNC_BATCH or now - self._last_sync >= FSYNC_INTERVAL:
+                self._sync(now)
+            elif self._timer is None:
+                # sin más envíos, las pendientes se sincronizan igual antes de FSYNC_INTERVAL
+                self._timer = threading.Timer(FSYNC_INTERVAL, self._timed_sync)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _timed_sync(self):
+        with self._lock:
+            self._timer = None
+            self._sync()
+
+    def _sync(self, now=None):
+        if self._fd is not None and self._pending:
+            os.fsync(self._fd)
+        self._pending = 0
+        self._last_sync = now if now is not None else time.monotonic()
+
+    def flush(self):
+        """Fuerza el fsync de las respuestas pendientes."""
+        with self._lock:
+            self._sync()
+
+    def clear(self):
+        """Vacía el diario (RESET). Los descriptores abiertos siguen siendo válidos."""
+        with self._lock:
+            fd = self._open()
+            os.ftruncate(fd, 0)
+            os.fsync(fd)
+            self._pending = 0
+        with self._read_lock:
+            self._reset_cache()
+
+    def close(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._fd is not None:
+                self._sync()
+                os.close(self._fd)
+                self._fd = None
+
+    # ---------------------------
+    # Lectura
+    # ---------------------------
+    def __iter__(self):
+        if not os.path.exists(self.path):
+            self._migrate_legacy()
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            for raw in f:
+                # una línea sin "\n" final es una escritura interrumpida: se ignora
+                if not raw.endswith(b"\n"):
+                    break
+                try:
+                    yield json.loads(raw)
+                except ValueError:
+                    continue
+
+    def _reset_cache(self):
+        self._cache = []
+        self._by_player = {}
+        self._by_question = {}
+        self._offset = 0
+        self._head = b""
+        self._ino = None
+        self.version += 1
+
+    def _refresh(self):
+        if not os.path.exists(self.path):
+            self._migrate_legacy()
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            if self._offset:
+                self._reset_cache()
+            return
+        with f:
+            st = os.fstat(f.fileno())
+            if st.st_ino != self._ino or st.st_size < self._offset or f.read(len(self._head)) != self._head:
+                self._reset_cache()
+                self._ino = st.st_ino
+            if st.st_size <= self._offset:
+                return
+            f.seek(self._offset)
+            chunk = f.read(st.st_size - self._offset)
+            metricas.add_bytes("answers", "read", len(chunk))
+        # sólo se consumen líneas completas; una línea a medio escribir se lee la próxima vez
+        end = chunk.rfind(b"\n") + 1
+        if not end:
+            return
+        for raw in chunk[:end].splitlines():
+            try:
+                entry = json.loads(raw)
+            except ValueError:
+                continue
+            pos = len(self._cache)
+            self._cache.append(entry)
+            self._by_player.setdefault(entry.get("jugador"), []).append(pos)
+            self._by_question.setdefault(entry.get("pregunta_idx"), []).append(pos)
+        if not self._offset:
+            self._head = chunk[:min(end, 64)]
+        self._offset += end
+        self.version += 1
+
+    def load_versioned(self):
+        """(versión, respuestas); sólo parsea lo agregado desde la última lectura."""
+        with self._read_lock:
+            self._refresh()
+            return self.version, list(self._cache)
+
+    def current_version(self):
+        """Versión del diario tras leer lo agregado, sin copiar las respuestas."""
+        with self._read_lock:
+            self._refresh()
+            return self.version
+
+    def load(self):
+        """Lista completa de respuestas (misma forma que el antiguo answers.json)."""
+        return self.load_versioned()[1]
+
+    # ---------------------------
+    # Consultas paginadas
+    # ---------------------------
+    def query(self, jugador=None, pregunta_idx=None, offset=0, limit=50):
+        """(total, página) con las respuestas más recientes primero.
+
+        Sólo se materializan los `limit` registros de la ventana pedida.
+        """
+        with self._read_lock:
+            self._refresh()
+            if jugador is not None and pregunta_idx is not None:
+                by_q = set(self._by_question.get(pregunta_idx, ()))
+                positions = [i for i in self._by_player.get(jugador, ()) if i in by_q]
+            elif jugador is not None:
+                positions = self._by_player.get(jugador, [])
+            elif pregunta_idx is not None:
+                positions = self._by_question.get(pregunta_idx, [])
+            else:
+                positions = range(len(self._cache))
+            total = len(positions)
+            start = total - 1 - max(0, offset)
+            stop = max(-1, start - max(0, limit))
+            return total, [self._cache[positions[i]] for i in range(start, stop, -1)]
+
+    def players(self):
+        with self._read_lock:
+            self._refresh()
+            return sorted(k for k in self._by_player if k is not None)
+
+    def question_indices(self):
+        with self._read_lock:
+            self._refresh()
+            return sorted(k for k in self._by_question if k is not None)
+
+    def export_csv(self, fileobj, columns, transform=None):
+        """Escribe todo el diario como CSV en `fileobj` (binario) leyendo línea a línea del disco."""
+        out = io.TextIOWrapper(fileobj, encoding="utf-8", newline="", write_through=True)
+        writer = csv.DictWriter(out, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        for entry in self:
+            writer.writerow(transform(entry) if transform else entry)
+        out.detach()
+
+
+def _encode(entry):
+    return (json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+# Un diario por ruta y por proceso: Streamlit re-ejecuta carrera.py en cada
+# rerun, pero los módulos importados se conservan entre sesiones.
+_logs = {}
+_logs_lock = threading.Lock()
+
+
+def get_log(path, legacy_path=None):
+    with _logs_lock:
+        log = _logs.get(path)
+        if log is None:
+            log = _logs[path] = AnswerLog(path, legacy_path)
+        return log
+
+
+@atexit.register
+def _close_all():
+    for log in list(_logs.values()):
+        try:
+            log.close()
+        except Exception:
+            pass
@@ -0,0 +1,124 @@
+# salas.py — Varias carreras simultáneas, cada una con su propio "shard"
+#
+# Cada sala tiene un código de juego y un directorio propio (salas/<CÓDIGO>/)
+# con su state.json/state.db, answers.jsonl y presence.json. Una sesión sólo
+# lee y escribe los archivos de su sala, así que dos clases jugando a la vez
+# no compiten por el mismo archivo ni por el mismo candado. El organizador y
+# el cuestionario de la sala se guardan en el estado de la propia sala.
+#
+# La sala principal (código vacío) usa los archivos de siempre en la raíz del
+# proyecto, de modo que una instalación existente sigue funcionando igual.
+#
+# Con varios workers, la presencia y los avisos de la sala pasan por el
+# coordinador compartido (coordinacion.py) en lugar de la memoria del proceso.
+import os
+import re
+import secrets
+import threading
+
+from estado import get_store
+from presencia import get_presence
+from respuestas import get_log
+
+ROOMS_DIR = "salas"
+DEFAULT_CODE = ""
+CODE_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"  # sin 0/O ni 1/I para dictarlo en clase
+CODE_LENGTH = 5
+_CODE_RE = re.compile(r"^[A-Z0-9]{3,12}$")
+
+
+class Room:
+    def __init__(self, code, directory, backend="json", coordinator=None):
+        self.code = code
+        self.dir = directory
+        self.backend = backend
+        self.coordinator = coordinator
+        self.state_file = os.path.join(directory, "state.db" if backend == "sqlite" else "state.json")
+        self.answers_file = os.path.join(directory, "answers.jsonl")
+        self.legacy_answers_file = os.path.join(directory, "answers.json")
+        self.presence_file = os.path.join(directory, "presence.json")
+
+    @property
+    def label(self):
+        return f"Sala {self.code}" if self.code else "Sala principal"
+
+    def store(self):
+        return get_store(self.state_file, self.backend)
+
+    def log(self):
+        return get_log(self.answers_file, self.legacy_answers_file)
+
+    def presence(self):
+        if self.coordinator is not None:
+            return self.coordinator.presence(self.code)
+        return get_presence(self.presence_file)
+
+    def changes(self):
+        """Notificador que despierta a las sesiones en espera (de todos los workers si hay coordinador)."""
+        if self.coordinator is not None:
+            return self.coordinator.events(self.code)
+        return self.store().changes
+
+    def broadcast(self):
+        # inicio / RESET: el almacén ya avisa dentro del proceso; los demás workers se
+        # enteran por el contador del coordinador
+        if self.coordinator is not None:
+            self.coordinator.publish(self.code)
+
+
+def normalize_code(code):
+    return (code or "").strip().upper()
+
+
+def _room_dir(base_dir, code):
+    return base_dir if code == DEFAULT_CODE else os.path.join(base_dir, ROOMS_DIR, code)
+
+
+_rooms = {}
+_rooms_lock = threading.Lock()
+
+
+def _room(base_dir, code, backend, coordinator):
+    key = (base_dir, code, backend, id(coordinator))
+    with _rooms_lock:
+        room = _rooms.get(key)
+        if room is None:
+            room = _rooms[key] = Room(code, _room_dir(base_dir, code), backend, coordinator)
+        return room
+
+
+def get_room(base_dir, code=DEFAULT_CODE, backend="json", coordinator=None):
+    """La sala con ese código, o None si no existe (la principal siempre existe)."""
+    code = normalize_code(code)
+    if code != DEFAULT_CODE and (not _CODE_RE.match(code) or not os.path.isdir(_room_dir(base_dir, code))):
+        return None
+    return _room(base_dir, code, backend, coordinator)
+
+
+def create_room(base_dir, backend="json", quiz_id=None, organizer=None, coordinator=None):
+    """Crea una sala con un código nuevo y devuelve su Room."""
+    os.makedirs(os.path.join(base_dir, ROOMS_DIR), exist_ok=True)
+    while True:
+        code = "".join(secrets.choice(CODE_ALPHABET) for _ in range(CODE_LENGTH))
+        try:
+            os.mkdir(_room_dir(base_dir, code))  # reserva el código de forma atómica
+        except FileExistsError:
+            continue
+        break
+    room = _room(base_dir, code, backend, coordinator)
+
+    def init(fs):
+        fs["quiz"] = quiz_id
+        fs["organizer"] = organizer
+    room.store().transaction(init)
+    return room
+
+
+def list_rooms(base_dir):
+    """Códigos de las salas creadas (sin la principal), en orden alfabético."""
+    try:
+        names = os.listdir(os.path.join(base_dir, ROOMS_DIR))
+    except FileNotFoundError:
+        return []
+    return sorted(n for n in names
+                  if _CODE_RE.match(n) and os.path.isdir(os.path.join(base_dir, ROOMS_DIR, n)))
@@ -0,0 +1,47 @@
+# Recuperación del backend diferido (estado.WriteBehindStateStore) ante un diario dañado.
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from estado import WriteBehindStateStore  # noqa: E402
+
+
+def _store(tmp_path):
+    # intervalo largo: los volcados sólo ocurren cuando la prueba llama a flush()
+    return WriteBehindStateStore(str(tmp_path / "state.json"), flush_interval=3600)
+
+
+def _journal(tmp_path, text):
+    (tmp_path / "state.json.journal").write_text(text, encoding="utf-8")
+
+
+def test_torn_line_does_not_hide_later_records(tmp_path):
+    # un volcado fallido dejó media línea; el reintento agregó registros válidos después
+    _journal(tmp_path, '{"v":2,"p":"ana","r":[1'
+                       + "\n" + json.dumps({"v": 3, "p": "ana", "r": [10, 1, 1]})
+                       + "\n" + json.dumps({"v": 3, "p": "bob", "r": [0, 0, 1]}) + "\n")
+    store = _store(tmp_path)
+    players = store.load()["players_info"]
+    assert players["ana"]["points"] == 10 and players["bob"]["preg"] == 1
+    assert store.version == 3
+
+    # el primer volcado compacta en una instantánea: lo recuperado no se pierde
+    store.flush()
+    store.close()
+    assert sorted(_store(tmp_path).load()["players_info"]) == ["ana", "bob"]
+
+
+def test_append_after_torn_tail_starts_a_new_line(tmp_path):
+    store = _store(tmp_path)
+    store.update("ana", lambda p, fs: p.update(points=10))
+    store.flush()  # instantánea inicial (cambio general pendiente) o diario
+    with open(store.journal_path, "a", encoding="utf-8") as f:
+        f.write('{"v":99,"p":"ana","r":[5')  # escritura interrumpida
+    store.update("bob", lambda p, fs: p.update(points=20))
+    store.flush()
+    store.close()
+
+    players = _store(tmp_path).load()["players_info"]
+    assert players["ana"]["points"] == 10 and players["bob"]["points"] == 20
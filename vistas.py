@@ -0,0 +1,80 @@
+# vistas.py — Fragmentos HTML de la interfaz, armados una vez por proceso
+#
+# Streamlit vuelve a ejecutar carrera.py entero en cada rerun, así que todo lo
+# que se define allí (incluidas las cachés lru_cache) se recrea cada vez. Este
+# módulo se importa una sola vez por proceso: la hoja de estilos se compacta al
+# importarlo y los fragmentos que cambian poco (barra de progreso por
+# (puntos, pregunta, total), encabezado de cada pregunta) se construyen una vez
+# y después sólo se reenvía la misma cadena.
+import functools
+import re
+import time
+
+_CSS = """
+<style>
+/* Pulso sutil para botones (continuar se verá animado) */
+.stButton>button {
+  transition: transform .14s ease-in-out, box-shadow .14s ease-in-out;
+  border-radius: 8px;
+  padding: 8px 18px;
+}
+.stButton>button:hover {
+  transform: translateY(-2px) scale(1.02);
+  box-shadow: 0 10px 24px rgba(0,0,0,0.12);
+}
+/* animación de pulso (glow) */
+@keyframes pulseGlow {
+  0% { box-shadow: 0 0 0 0 rgba(34,197,94,0.35); }
+  70% { box-shadow: 0 0 0 10px rgba(34,197,94,0); }
+  100% { box-shadow: 0 0 0 0 rgba(34,197,94,0); }
+}
+/* aplicamos glow al último botón en el contenedor .continue-area si existe */
+.continue-area .stButton>button {
+  animation: pulseGlow 1.8s infinite;
+  border: 2px solid rgba(34,197,94,0.12);
+}
+/* barra de progreso */
+.barra { display:flex; align-items:center; gap:12px; }
+.barra-pista { flex:1; position:relative; height:40px; background:#111; border-radius:10px;
+               padding:6px; overflow:hidden; border:1px solid #333; }
+.barra-relleno { position:absolute; left:0; top:0; height:100%; background:rgba(34,197,94,0.18);
+                 border-radius:8px; transition:width .4s ease; }
+.barra-nave { position:absolute; top:4px; font-size:22px; transform:translateX(-50%); transition:left .4s ease; }
+.barra-meta { position:absolute; right:10px; top:8px; font-size:18px; }
+.barra-cuenta { min-width:120px; text-align:right; font-weight:700; color:#cfe8d8; }
+</style>
+"""
+
+
+def _compactar(css):
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    return re.sub(r"\s*([{}:;,>])\s*", r"\1", css).strip()
+
+
+ESTILOS = _compactar(_CSS)
+
+
+@functools.lru_cache(maxsize=4096)
+def barra_html(points, preg, total, points_per_correct):
+    progreso = points / (points_per_correct * total) if total > 0 else 0
+    progreso = min(1.0, max(0.0, progreso))
+    left_percent = max(2, min(98, int(progreso * 100)))
+    # barra + contador numérico a la derecha (estilos en ESTILOS)
+    return (
+        '<div class="barra"><div class="barra-pista">'
+        f'<div class="barra-relleno" style="width:{progreso * 100}%"></div>'
+        f'<div class="barra-nave" style="left:{left_percent}%">🛸</div>'
+        '<div class="barra-meta">🌕</div></div>'
+        f'<div class="barra-cuenta">{preg} / {total}</div></div>'
+    )
+
+
+@functools.lru_cache(maxsize=1024)
+def pregunta_md(idx, total, texto):
+    return f"### Pregunta #{idx + 1} / {total}\n\n{texto}"
+
+
+@functools.lru_cache(maxsize=4096)
+def format_ts(ts):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts)) if ts else "—"